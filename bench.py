@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# SCT parser benchmark
+# We run each stage of the parser pipeline on synthetic (or given) results and
+# report its throughput and peak memory. Results can be saved as a baseline and
+# compared to a baseline, to detect regressions.
+
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import functools
+from typing import Any, Callable, Optional, TypedDict
+
+import parser  # pylint: disable=deprecated-module
+import synth
+
+
+# The measurements of a stage
+class Stage(TypedDict):
+    records: int
+    seconds: float
+    rate: float
+    peak: int
+
+
+# Run a stage and measure it
+# n is the number of records processed by the stage or None, in which case we
+# take the number of records returned by the stage.
+# With memory, we trace memory allocations to measure the peak memory used by
+# the stage; this slows it down a lot, so we do not rely on its timing then.
+# We return the result of the stage and its measurements.
+def measure(
+        n: Optional[int], func: Callable[[], Any],
+        memory: bool) -> tuple[Any, Stage]:
+    gc.collect()
+
+    if memory:
+        tracemalloc.start()
+
+    t = time.perf_counter()
+    r = func()
+    s = time.perf_counter() - t
+    peak = 0
+
+    if memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    if n is None:
+        n = len(r)
+
+    return r, {
+        'records': n,
+        'seconds': s,
+        'rate': n / s if s else 0,
+        'peak': peak,
+    }
+
+
+# Read an .ekl log file with the parser
+def parse_ekl(ekl: str) -> parser.DbType:
+    with open(ekl, 'r', encoding='utf-16') as f:
+        return list(parser.ekl_parser(f))
+
+
+# Write all the tests with a new writer
+def write_all(
+        new: Callable[[], parser.Writer], cross_check: parser.DbType) -> None:
+    w = new()
+
+    for x in cross_check:
+        w.write(x)
+
+    w.close()
+
+
+# Run all the stages of the pipeline
+# We return the measurements of all stages, by name.
+def run_stages(
+        ekl: str, seq: str, config: str, outdir: str,
+        memory: bool) -> dict[str, Stage]:
+
+    st: dict[str, Stage] = {}
+    db1, st['ekl_parser'] = measure(None, lambda: parse_ekl(ekl), memory)
+    db2 = parser.read_seq_file(seq)
+
+    cross_check, st['combine_dbs'] = measure(
+        len(db1), lambda: list(parser.combine_dbs(db1, db2)), memory)
+
+    conf = parser.read_config(config)
+    n = len(cross_check)
+    _, st['apply_rules'] = measure(
+        n, lambda: parser.apply_rules(cross_check, conf), memory)
+    _, st['filter_data'] = measure(
+        n, lambda: parser.filter_data(cross_check, "x['result'] != 'PASS'"),
+        memory)
+
+    c = list(cross_check)
+    _, st['sort_data'] = measure(
+        n, lambda: parser.sort_data(
+            c, 'group,descr,set guid,test set,sub set,guid,name,log'),
+        memory)
+
+    _, st['uniq'] = measure(n, lambda: parser.uniq(cross_check), memory)
+    bins, st['bin_results'] = measure(
+        n, lambda: parser.bin_results(cross_check), memory)
+    _, st['gen_md'] = measure(
+        n, lambda: parser.gen_md(
+            f'{outdir}/result.md', set(bins.keys()), bins, {}), memory)
+
+    st.update(run_writers(cross_check, outdir, memory))
+    return st
+
+
+# Run all the writers
+# We return the measurements of all writers, by name.
+def run_writers(
+        cross_check: parser.DbType, outdir: str,
+        memory: bool) -> dict[str, Stage]:
+
+    fields = parser.discover_fields(cross_check)
+    writers: dict[str, Callable[[], parser.Writer]] = {
+        'CsvWriter': lambda: parser.CsvWriter(f'{outdir}/out.csv', fields),
+        'JsonWriter': lambda: parser.JsonWriter(f'{outdir}/out.json'),
+        'JsonlWriter': lambda: parser.JsonlWriter(f'{outdir}/out.jsonl'),
+        'YamlWriter': lambda: parser.YamlWriter(f'{outdir}/out.yaml', {}),
+        'SqliteWriter': lambda: parser.SqliteWriter(
+            f'{outdir}/out.sqlite', fields, {}),
+    }
+    st: dict[str, Stage] = {}
+
+    for k, w in writers.items():
+        _, st[k] = measure(
+            len(cross_check), functools.partial(write_all, w, cross_check),
+            memory)
+
+    return st
+
+
+# Print the measurements of all stages as a table
+def print_stages(st: dict[str, Stage]) -> None:
+    print(f"{'Stage':<12} {'Records':>10} {'Seconds':>8} {'Records/s':>11}"
+          f" {'Peak MiB':>9}")
+
+    for k, s in st.items():
+        print(f"{k:<12} {s['records']:>10} {s['seconds']:>8.3f}"
+              f" {s['rate']:>11.0f} {s['peak'] / 2**20:>9.1f}")
+
+
+# Compare the measurements of all stages to a baseline
+# A stage regresses when its throughput is lower or its peak memory is higher
+# than the baseline by more than the threshold ratio. We ignore stages taking
+# less than 10 ms and memory differences below 1 MiB, which are noise.
+# We return the number of regressions.
+def compare(
+        st: dict[str, Stage], baseline: dict[str, Stage],
+        threshold: float) -> int:
+
+    n = 0
+
+    for k, s in st.items():
+        if k not in baseline:
+            continue
+
+        b = baseline[k]
+
+        if s['rate'] < b['rate'] * (1 - threshold) \
+                and s['seconds'] > 0.01:
+            logging.error(
+                f"{parser.red}Stage `{k}' throughput regressed{parser.normal}"
+                f" from {b['rate']:.0f} to {s['rate']:.0f} records/s")
+            n += 1
+
+        if s['peak'] > b['peak'] * (1 + threshold) \
+                and s['peak'] - b['peak'] > 2**20:
+            logging.error(
+                f"{parser.red}Stage `{k}' peak memory regressed{parser.normal}"
+                f" from {b['peak']} to {s['peak']} bytes")
+            n += 1
+
+    return n
+
+
+if __name__ == '__main__':
+    here = os.path.dirname(os.path.realpath(__file__))
+    argp = argparse.ArgumentParser(
+        description='Benchmark the SCT parser stages.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argp.add_argument(
+        '--debug', action='store_true', help='Turn on debug messages')
+    argp.add_argument(
+        '--tests', type=int, default=200000,
+        help='Approximate number of synthetic tests to generate')
+    argp.add_argument(
+        '--seed', type=int, default=0, help='Random generator seed')
+    argp.add_argument(
+        '--source-seq', help='Source .seq filename for synthetic results',
+        default=f'{here}/contrib/v23.03_2.0.0/EBBR.seq')
+    argp.add_argument(
+        '--config', help='Configuration filename',
+        default=f'{here}/EBBR.yaml')
+    argp.add_argument(
+        '--ekl', help='Input .ekl filename, instead of synthetic results')
+    argp.add_argument(
+        '--seq', help='Input .seq filename, instead of synthetic results')
+    argp.add_argument(
+        '--no-memory', action='store_true',
+        help='Do not measure memory, which takes a second, slower pass')
+    argp.add_argument(
+        '--repeat', type=int, default=3,
+        help='Number of timing passes, of which we keep the best')
+    argp.add_argument('--baseline', help='Input baseline .json filename')
+    argp.add_argument('--save', help='Output baseline .json filename')
+    argp.add_argument(
+        '--threshold', type=float, default=0.25,
+        help='Ratio above which a difference with the baseline is a'
+             ' regression')
+    args = argp.parse_args()
+
+    parser.init_colors()
+
+    logging.basicConfig(
+        format='%(levelname)s %(funcName)s: %(message)s',
+        level=logging.DEBUG if args.debug else logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.ekl is None or args.seq is None:
+            args.ekl = f'{tmp}/synth.ekl'
+            args.seq = args.source_seq
+            synth.generate(
+                args.ekl, args.seq, args.config, args.tests, args.seed)
+
+        # We measure the time and the memory in separate passes.
+        # We keep the best time of each stage.
+        stages = run_stages(args.ekl, args.seq, args.config, tmp, False)
+
+        for _ in range(1, args.repeat):
+            for k, v in run_stages(
+                    args.ekl, args.seq, args.config, tmp, False).items():
+                if v['seconds'] < stages[k]['seconds']:
+                    stages[k] = v
+
+        if not args.no_memory:
+            peaks = run_stages(args.ekl, args.seq, args.config, tmp, True)
+
+            for k, v in peaks.items():
+                stages[k]['peak'] = v['peak']
+
+    print_stages(stages)
+
+    if args.save is not None:
+        with open(args.save, 'w') as jsonfile:
+            json.dump(stages, jsonfile, sort_keys=True, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as jsonfile:
+            r = compare(stages, json.load(jsonfile), args.threshold)
+
+        if r:
+            logging.error(f"{r} {parser.maybe_plural(r, 'regression')}")
+            sys.exit(1)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# SCT fleet aggregation
+# We merge the results of many processed runs, typically of the same sequence
+# file on many boards and firmware builds, into a matrix of runs by tests.
+# Each test identity is interned once and each cell of the matrix holds a small
+# integer result code, so that we never hold the tests of more than one run.
+# From this matrix, we report per-test failure rates and flakiness, and
+# per-board summaries.
+
+import argparse
+import array
+import glob
+import logging
+import os
+import sys
+from typing import Iterable, Iterator
+
+import parser  # pylint: disable=deprecated-module
+
+# The result code of a test, which did not run
+absent = 0
+
+# The fields of the per-test statistics
+stats_fields = [
+    'group', 'test set', 'sub set', 'set guid', 'name', 'guid', 'runs',
+    'failures', 'failure rate', 'flaky boards']
+
+
+# A matrix of runs by tests
+# Tests are identified by their diff_keys fields, as when comparing two runs.
+# Each run has a row of result codes, indexed by test; rows added before a
+# test was first seen are shorter, and the test is absent from those runs.
+class Fleet:
+    def __init__(self) -> None:
+        self.tests: dict[parser.GroupKey, int] = {}
+        self.info: parser.DbType = []
+        self.codes: dict[str, int] = {}
+        self.results = ['']
+        self.runs: list[str] = []
+        self.boards: list[str] = []
+        self.matrix: list['array.array[int]'] = []
+
+    # Return the code of a result
+    def code(self, result: str) -> int:
+        c = self.codes.get(result)
+
+        if c is None:
+            c = len(self.results)
+
+            if c > 255:
+                logging.error(f"{parser.red}Too many results{parser.normal}")
+                sys.exit(1)
+
+            self.codes[result] = c
+            self.results.append(result)
+
+        return c
+
+    # Add the tests of a run of a board
+    # When a test appears more than once in a run, a failure wins.
+    def add(self, name: str, board: str, db: Iterable[parser.DbEntry]) -> None:
+        key = parser.tuple_key(parser.diff_keys)
+        fail = self.code('FAILURE')
+        row = array.array('B', bytes(len(self.tests)))
+
+        for x in db:
+            k = key(x)
+            j = self.tests.get(k)
+
+            if j is None:
+                j = len(self.tests)
+                self.tests[k] = j
+                self.info.append({
+                    **parser.set_entry(x), 'name': x['name'],
+                    'guid': x['guid']})
+
+            if j >= len(row):
+                row.extend(bytes(j + 1 - len(row)))
+
+            if row[j] != fail:
+                row[j] = self.code(x['result'])
+
+        self.runs.append(name)
+        self.boards.append(board)
+        self.matrix.append(row)
+
+
+# Accumulate the results of the runs of each board
+# We return a dict of masks of failed and passed tests, indexed by board.
+def board_masks(
+        fleet: Fleet) -> dict[str, tuple[bytearray, bytearray]]:
+    n = len(fleet.tests)
+    fail = fleet.codes.get('FAILURE')
+    ok = fleet.codes.get('PASS')
+    r: dict[str, tuple[bytearray, bytearray]] = {}
+
+    for b, row in zip(fleet.boards, fleet.matrix):
+        f, p = r.setdefault(b, (bytearray(n), bytearray(n)))
+
+        for j, c in enumerate(row):
+            if c == fail:
+                f[j] = 1
+            elif c == ok:
+                p[j] = 1
+
+    return r
+
+
+# Compute the per-test statistics
+# A test is flaky on a board when it both failed and passed in runs of this
+# board. We return the tests, which failed at least once, with their number of
+# runs, failures, failure rate and number of boards on which they are flaky,
+# highest failure rate first.
+def test_stats(
+        fleet: Fleet,
+        masks: dict[str, tuple[bytearray, bytearray]]) -> parser.DbType:
+    n = len(fleet.tests)
+    fail = fleet.codes.get('FAILURE')
+    ran = [0] * n
+    failed = [0] * n
+    flaky = [0] * n
+
+    for row in fleet.matrix:
+        for j, c in enumerate(row):
+            if c != absent:
+                ran[j] += 1
+
+                if c == fail:
+                    failed[j] += 1
+
+    for f, p in masks.values():
+        for j in range(n):
+            if f[j] and p[j]:
+                flaky[j] += 1
+
+    r = [{
+        **fleet.info[j],
+        'runs': str(ran[j]),
+        'failures': str(failed[j]),
+        'failure rate': f'{100 * failed[j] / ran[j]:.1f}%',
+        'flaky boards': str(flaky[j]),
+    } for j in sorted(
+        (j for j in range(n) if failed[j]),
+        key=lambda j: (-failed[j] / ran[j], -flaky[j], j))]
+
+    return r
+
+
+# Compute the per-board summaries
+def board_stats(
+        fleet: Fleet,
+        masks: dict[str, tuple[bytearray, bytearray]]) -> parser.DbType:
+    r = []
+
+    for b, (f, p) in sorted(masks.items()):
+        r.append({
+            'board': b,
+            'runs': str(fleet.boards.count(b)),
+            'failing tests': str(f.count(1)),
+            'flaky tests': str(sum(1 for x, y in zip(f, p) if x and y)),
+        })
+
+    return r
+
+
+# Read the tests of a processed run
+# This is either a markdown summary, read with its data when possible, or a
+# JSON Lines output, which we read test by test.
+def read_run(filename: str) -> Iterator[parser.DbEntry]:
+    import json  # pylint: disable=import-outside-toplevel
+
+    if not filename.endswith('.jsonl'):
+        yield from parser.read_md(filename)
+        return
+
+    logging.debug(f'Read {filename}')
+
+    with open(filename, 'r') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+# Expand the runs given on the command line
+# Each run is a filename, optionally prefixed with `board='. A folder stands
+# for all the markdown summaries with data under it, such as the output folder
+# of the parser batch mode. The board defaults to the run filename.
+# We return a list of (run filename, board) tuples.
+def expand_runs(args: list[str]) -> list[tuple[str, str]]:
+    r = []
+
+    for a in args:
+        board, sep, path = a.partition('=')
+
+        if os.path.exists(a) or not sep:
+            board, path = '', a
+
+        if not os.path.isdir(path):
+            r.append((path, board or path))
+            continue
+
+        for d in sorted(glob.glob(
+                os.path.join(glob.escape(path), '**', '*.md.jsonl.gz'),
+                recursive=True)):
+            md = d[:-len('.jsonl.gz')]
+            r.append((md, board or md))
+
+    return r
+
+
+# Generate the fleet markdown report
+# We output meta-data
+def gen_fleet_md(
+        filename: str, tests: parser.DbType, boards: parser.DbType,
+        meta: parser.MetaData) -> None:
+
+    logging.debug(f'Generate {filename}')
+
+    with open(filename, 'w') as resultfile:
+        resultfile.write("# SCT Fleet Summary\n\n")
+        resultfile.write("## 1. Boards")
+        parser.dict_2_md(boards, resultfile)
+        resultfile.write("## 2. Failing tests")
+        parser.dict_2_md(tests, resultfile)
+
+        # Meta-data
+        resultfile.write('## Meta-data\n\n')
+        resultfile.write("|  |  |\n")
+        resultfile.write("|--|--|\n")
+
+        for k in sorted(meta.keys()):
+            resultfile.write(f"|{k}:|{meta[k]}|\n")
+
+
+if __name__ == '__main__':
+    here = os.path.dirname(os.path.realpath(__file__))
+    argp = argparse.ArgumentParser(
+        description='Aggregate the results of many processed SCT runs.',
+        epilog='Each run is a markdown summary generated by the parser'
+               ' (read with its data when possible), a JSON Lines output'
+               ' or a folder, such as the output folder of the batch mode.'
+               ' It can be prefixed with a board name and `=\'; by default'
+               ' each run is its own board.'
+               ' A test is flaky on a board when it both failed and passed'
+               ' in runs of this board.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argp.add_argument(
+        '--debug', action='store_true', help='Turn on debug messages')
+    argp.add_argument(
+        '--md', help='Output .md filename', default='fleet.md')
+    argp.add_argument('--csv', help='Output per-test .csv filename')
+    argp.add_argument(
+        'runs', nargs='+', help='Input runs, as [board=]filename')
+    args = argp.parse_args()
+
+    parser.init_colors()
+
+    logging.basicConfig(
+        format='%(levelname)s %(funcName)s: %(message)s',
+        level=logging.DEBUG if args.debug else logging.INFO)
+
+    fleet = Fleet()
+
+    for name, board in expand_runs(args.runs):
+        fleet.add(name, board, read_run(name))
+
+    all_masks = board_masks(fleet)
+    all_tests = test_stats(fleet, all_masks)
+    all_boards = board_stats(fleet, all_masks)
+    nf = sum(1 for x in all_tests if x['flaky boards'] != '0')
+
+    logging.info(
+        f"{len(fleet.runs)} run(s), {len(all_masks)} board(s),"
+        f" {len(fleet.tests)} test(s), {len(all_tests)} failing, {nf} flaky")
+
+    gen_fleet_md(
+        args.md, all_tests, all_boards, parser.meta_data(sys.argv, here))
+
+    if args.csv is not None:
+        parser.write_all(
+            [parser.CsvWriter(args.csv, stats_fields)], all_tests)
@@ -2,39 +2,41 @@
 # SCT log parser
 
 
+# Modules, which are needed only by some stages, are imported by those stages
+# to keep startup fast; see the README.md.
 import sys
+import abc
 import argparse
-import csv
 import logging
-import json
 import re
-import hashlib
 import os
-import curses
 import time
-import subprocess
-from typing import Any, IO, Optional, cast, TypedDict, Callable
+import math
+import functools
+import itertools
+import codecs
+import array
+import pickle
+import stat
+import contextlib
+from typing import Any, IO, Optional, cast, TypedDict, Callable, Iterable, \
+    Iterator, NotRequired, Hashable
 import yaml
 
-try:
-    from packaging import version
-except ImportError:
-    print('No packaging. You should install python3-packaging...')
-
-try:
-    from junit_xml import TestSuite, TestCase
-except ImportError:
-    print(
-        'No junit_xml. You should install junit_xml for junit output'
-        ' support...')
-
 Dumper: Any
+SafeLoader: Any
 
 try:
     from yaml import CDumper as Dumper
 except ImportError:
     from yaml import Dumper
 
+# We only load plain data, with the C loader when available.
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 DbEntry = dict[str, str]
 DbType = list[DbEntry]
 
@@ -51,6 +53,7 @@ MetaData = dict[str, str]
 
 class SeqFile(TypedDict):
     sha256: str
+    nsha256: NotRequired[str]
     name: str
     config: str
 
@@ -60,26 +63,85 @@ class SeqDb(TypedDict):
     seq_files: list[SeqFile]
 
 
+# Index of the database of known sequence files
+# Entries are indexed by sha256, and by sha256 of their normalized contents
+# when known.
+class SeqIndex(TypedDict):
+    sha256: dict[str, SeqFile]
+    nsha256: dict[str, SeqFile]
+
+
 BinsType = dict[str, list[dict[str, str]]]
+GroupKey = tuple[str, ...]
+
+
+# Index of configuration rules
+# Rules, which pin a guid or a set guid in their criteria are bucketed by
+# that value, for each of the indexed keys. We also remember all the rules
+# of a bucket key, for the rare tests where we cannot rely on a lookup.
+# The remaining rules are kept in a fallback list.
+# All rules are referred to by their position in the configuration.
+class RulesIndex(TypedDict):
+    buckets: dict[str, dict[str, list[int]]]
+    indexed: dict[str, list[int]]
+    fallback: list[int]
+
+
+# The keys, on which we index rules, by order of preference.
+index_keys = ['guid', 'set guid']
+
+# The length of a GUID string such as XXXXXXXX-XXXX-XXXX-XXXX-XXXXXXXXXXXX.
+guid_len = 36
 
-# Not all yaml versions have a Loader argument.
-if 'packaging.version' in sys.modules and \
-   version.parse(yaml.__version__) >= version.parse('5.1'):
-    yaml_load_args = {'Loader': yaml.FullLoader}
-else:
-    yaml_load_args = {}
+# The fields of a test, which come from the HEAD line of its test set.
+head_fields = [
+    'group', 'test set', 'sub set', 'set guid', 'iteration', 'start date',
+    'start time', 'revision', 'descr', 'device path']
+
+# The fields, which identify a test when comparing two runs.
+diff_keys = ['set guid', 'sub set', 'guid', 'name', 'iteration']
+
+# The kinds of differences between two runs, in reporting order.
+diff_kinds = [
+    'new failures', 'fixed', 'result changes', 'added tests', 'removed tests',
+    'added test sets', 'removed test sets']
+
+# The markdown summary of a followed run is updated again only once this many
+# times the duration of its last update has elapsed. See throttle().
+follow_md_ratio = 10
+
+# The version of the format of the markdown summary data. See gen_md_data().
+md_data_version = 1
+
+# The number of rows of markdown tables rendered at once.
+md_batch = 1000
+
+# The number of tests on which the printed fields widths are computed.
+print_sample = 1000
 
 # Colors
+# They are set up by init_colors().
 normal = ''
 red = ''
 yellow = ''
 green = ''
 
-if os.isatty(sys.stdout.fileno()):
+
+# Set up colors when stdout is a terminal
+# We call this only from the main program, so that merely importing us does not
+# probe the terminal.
+def init_colors() -> None:
+    # pylint: disable=global-statement
+    global normal, red, yellow, green
+
+    if not os.isatty(sys.stdout.fileno()):
+        return
+
     try:
+        import curses  # pylint: disable=import-outside-toplevel
+
         curses.setupterm()
         setafb = curses.tigetstr('setaf') or bytes()
-        setaf = setafb.decode()
         tmp = curses.tigetstr('sgr0')
         normal = tmp.decode() if tmp is not None else ''
         red = curses.tparm(setafb, curses.COLOR_RED).decode() or ''
@@ -116,6 +178,38 @@ def key_value_find(
     return found
 
 
+# Return a function computing the tuple of the values of keys for a test
+def tuple_key(keys: Iterable[str]) -> Callable[[DbEntry], GroupKey]:
+    k = tuple(keys)
+
+    def func(x: DbEntry) -> GroupKey:
+        return tuple(x[i] for i in k)
+
+    return func
+
+
+# Partition tests data in a single pass
+# key is a function computing the group of a test, as a tuple of values; see
+# tuple_key().
+# We return a dict of lists of tests indexed by group, in order of first
+# appearance. Tests keep their relative order inside each group.
+def group_by(
+        cross_check: Iterable[DbEntry], key: Callable[[DbEntry], GroupKey]
+        ) -> dict[GroupKey, DbType]:
+
+    h: dict[GroupKey, DbType] = {}
+
+    for x in cross_check:
+        k = key(x)
+
+        if k in h:
+            h[k].append(x)
+        else:
+            h[k] = [x]
+
+    return h
+
+
 # Were we intrept test logs into test dicts
 def test_parser(string: list[str], current: dict[str, str]) -> dict[str, str]:
     test_list = {
@@ -132,10 +226,40 @@ def test_parser(string: list[str], current: dict[str, str]) -> dict[str, str]:
     return test_list
 
 
-# Parse the ekl file, and create a map of the tests
-def ekl_parser(file: list[str]) -> list[dict[str, str]]:
-    # create our "database" dict
-    temp_list = []
+# Parse the "HEAD" line of a test set
+def head_parser(split_line: list[str]) -> dict[str, str]:
+    # split the header into test group and test set.
+    try:
+        group, Set = split_line[12].split('\\')
+    except Exception:
+        group, Set = '', split_line[12]
+    return {
+        'group': group,
+        'test set': Set,
+        'sub set': split_line[10],
+        'set guid': split_line[8],
+        'iteration': split_line[4],
+        'start date': split_line[6],
+        'start time': split_line[7],
+        'revision': split_line[9],
+        'descr': split_line[11],
+        'device path': '|'.join(split_line[13:]),
+    }
+
+
+# Parse the ekl file, and yield the tests one by one
+# The file can be any iterable of lines, such as an opened file object, which
+# allows to parse arbitrarily large logs in constant memory.
+# first is the number of the first line, for the messages, when the lines do
+# not start at the beginning of the file.
+# When keep is provided, it is called on the HEAD fields of each test set and
+# the tests of the sets for which it returns False are dropped. Their set guid
+# is still added to the pruned set.
+def ekl_parser(
+        file: Iterable[str],
+        keep: Optional[Callable[[DbEntry], bool]] = None,
+        pruned: Optional[set[str]] = None,
+        first: int = 0) -> Iterator[DbEntry]:
     # All tests are grouped by the "HEAD" line, which precedes them.
     current: dict[str, str] = {}
 
@@ -145,7 +269,16 @@ def ekl_parser(file: list[str]) -> list[dict[str, str]]:
     # Number of skipped tests sets
     s = 0
 
-    for i, line in enumerate(file):
+    # Total number of tests
+    t = 0
+
+    # Skip the tests of the current set
+    skip = False
+
+    # Per-record debug messages are formatted only when needed.
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+    for i, line in enumerate(file, start=first):
         # Strip the line from trailing whitespaces
         line = line.rstrip()
 
@@ -161,42 +294,37 @@ def ekl_parser(file: list[str]) -> list[dict[str, str]]:
         # entry. Then reset current as a precaution, as well as our test
         # counter.
         if split_line[0] == '' and split_line[1] == "TERM":
-            if not n:
-                logging.debug(f"Skipped test set `{current['sub set']}'")
+            if not n and not skip:
+                if debug:
+                    logging.debug(
+                        f"Skipped test set `{current['sub set']}'")
 
-                temp_list.append({
+                yield {
                     **current,
                     'name': '',
                     'guid': '',
                     'log': '',
                     'result': 'SKIPPED',
-                })
+                }
 
                 s += 1
+                t += 1
 
             current = {}
             n = 0
+            skip = False
             continue
 
         # The "HEAD" tag is the only indcation we are on a new test set
         if split_line[0] == '' and split_line[1] == "HEAD":
-            # split the header into test group and test set.
-            try:
-                group, Set = split_line[12].split('\\')
-            except Exception:
-                group, Set = '', split_line[12]
-            current = {
-                'group': group,
-                'test set': Set,
-                'sub set': split_line[10],
-                'set guid': split_line[8],
-                'iteration': split_line[4],
-                'start date': split_line[6],
-                'start time': split_line[7],
-                'revision': split_line[9],
-                'descr': split_line[11],
-                'device path': '|'.join(split_line[13:]),
-            }
+            current = head_parser(split_line)
+            skip = keep is not None and not keep(current)
+
+            if skip and pruned is not None:
+                pruned.add(current['set guid'])
+
+        elif skip:
+            continue
 
         # FIXME:? EKL file has an inconsistent line structure,
         # sometime we see a line that consits ' dump of GOP->I\n'
@@ -210,19 +338,21 @@ def ekl_parser(file: list[str]) -> list[dict[str, str]]:
                 # put the test into a dict, and then place that dict in another
                 # dict with GUID as key
                 tmp_dict = test_parser(split_test, current)
-                temp_list.append(tmp_dict)
-                n += 1
             except Exception:
                 logging.error(f"Line {i+1}: {split_line}")
                 logging.error(f"{red}your log may be corrupted{normal}")
                 sys.exit(1)
+
+            yield tmp_dict
+            n += 1
+            t += 1
         else:
             logging.error(f"{red}Unparsed line{normal} {i} `{line}'")
 
     if s:
         logging.debug(f'{s} skipped test set(s)')
 
-    return temp_list
+    logging.debug(f"{t} test(s)")
 
 
 # Parse Seq file, used to tell which tests should run.
@@ -267,41 +397,32 @@ def seq_parser(file: IO[str]) -> list[dict[str, str]]:
 
 # Print items by "group"
 def key_tree_2_md(input_list: list[dict[str, str]], file: IO[str]) -> None:
-    h: dict[str, list[dict[str, str]]] = {}
-
     # Bin by group
-    for t in input_list:
-        g = t['group']
-
-        if g not in h:
-            h[g] = []
-
-        h[g].append(t)
+    h = group_by(input_list, tuple_key(['group']))
 
     # Print each group
     for g in sorted(h.keys()):
-        file.write("### " + g)
+        file.write("### " + g[0])
         dict_2_md(h[g], file)
 
 
 # generic writer, takes a list of dicts and turns the dicts into an MD table.
+# The header is made from the keys of the first dict. Each row is rendered in
+# one go and the rows are written in batches.
 def dict_2_md(input_list: list[dict[str, str]], file: IO[str]) -> None:
     if len(input_list) > 0:
         file.write("\n\n")
-        k = input_list[0].keys()
+        k = list(input_list[0].keys())
         # create header for MD table using dict keys
-        temp_string1, temp_string2 = "|", "|"
-        for x in k:
-            temp_string1 += (x + "|")
-            temp_string2 += ("---|")
-        file.write(temp_string1 + "\n" + temp_string2 + "\n")
+        file.write(
+            "|" + "".join(f"{x}|" for x in k) + "\n|" + "---|" * len(k) + "\n")
+
         # print each item from the dict into the table
-        for w in input_list:
-            test_string = "|"
-            for y in k:
-                v = w[y] if y in w else ''
-                test_string += v + "|"
-            file.write(test_string + '\n')
+        for i in range(0, len(input_list), md_batch):
+            file.write("".join(
+                "|" + "|".join(w[y] if y in w else '' for y in k) + "|\n"
+                for w in input_list[i:i + md_batch]))
+
     # seprate table from other items in MD
     file.write("\n\n")
 
@@ -346,30 +467,106 @@ def matches_crit(test: DbEntry, crit: DbEntry) -> bool:
     return True
 
 
+# Build an index of the configuration rules
+# A rule is bucketed under the first of the index keys for which its criteria
+# value has the length of a GUID. Otherwise it goes into the fallback list.
+def index_rules(conf: ConfigType) -> RulesIndex:
+    index: RulesIndex = {
+        'buckets': {k: {} for k in index_keys},
+        'indexed': {k: [] for k in index_keys},
+        'fallback': [],
+    }
+
+    for i, r in enumerate(conf):
+        crit = r['criteria']
+
+        for k in index_keys:
+            if k in crit and len(crit[k]) == guid_len:
+                index['buckets'][k].setdefault(crit[k], []).append(i)
+                index['indexed'][k].append(i)
+                break
+        else:
+            index['fallback'].append(i)
+
+    m = [f"{len(index['indexed'][k])} on {k}" for k in index_keys]
+    m.append(f"{len(index['fallback'])} unindexed")
+    logging.debug(f"Indexed rule(s): {', '.join(m)}")
+
+    return index
+
+
+# Find the rules, which could match a test, in configuration order
+# As matching is done on sub-strings, a criteria value can only match a test
+# value of the same length when they are equal. This is the common case, where
+# we can do a lookup. A criteria value can never match a shorter test value.
+# Only longer test values require to consider all the rules of a bucket key.
+def candidate_rules(test: DbEntry, index: RulesIndex) -> list[int]:
+    r = list(index['fallback'])
+
+    for k in index_keys:
+        if k not in test:
+            continue
+
+        n = len(test[k])
+
+        if n == guid_len:
+            r += index['buckets'][k].get(test[k], [])
+        elif n > guid_len:
+            r += index['indexed'][k]
+
+    r.sort()
+    return r
+
+
+# Log statistics about the x rules applied to s tests
+# stats holds the number of matches for each rule.
+def rules_stats(stats: dict[str, int], s: int, x: int) -> None:
+    n = 0
+
+    for rule, cnt in stats.items():
+        logging.debug(f"{cnt} matche(s) for rule `{rule}'")
+        n += cnt
+
+    if n:
+        logging.info(
+            f"Updated {n} {maybe_plural(n, 'test')} out of {s}"
+            f" after applying {x} {maybe_plural(x, 'rule')}")
+
+
 # Apply all configuration rules to the tests
 # We modify cross_check in-place
-def apply_rules(cross_check: DbType, conf: ConfigType) -> None:
+# The rules are indexed beforehand, to evaluate only the candidate rules for
+# each test. The first matching rule in configuration order still wins.
+# We return the set of fields added or modified by the rules, which matched.
+def apply_rules(cross_check: DbType, conf: ConfigType) -> set[str]:
     # Prepare statistics counters
     stats = {}
+    used = set()
 
     for r in conf:
         stats[r['rule']] = 0
 
+    index = index_rules(conf)
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+
     # Apply rules on each test data
     s = len(cross_check)
 
     for i in range(s):
         test = cross_check[i]
 
-        for r in conf:
+        for j in candidate_rules(test, index):
+            r = conf[j]
+
             if not matches_crit(test, r['criteria']):
                 continue
 
             rule = r['rule']
 
-            logging.debug(
-                f"Applying rule `{rule}'"
-                f" to test {i} `{test['name']}'")
+            if debug:
+                logging.debug(
+                    f"Applying rule `{rule}'"
+                    f" to test {i} `{test['name']}'")
 
             test.update({
                 **r['update'],
@@ -377,40 +574,122 @@ def apply_rules(cross_check: DbType, conf: ConfigType) -> None:
             })
 
             stats[rule] += 1
+            used.add(j)
             break
 
     # Statistics
-    n = 0
-
-    for rule, cnt in stats.items():
-        logging.debug(f"{cnt} matche(s) for rule `{rule}'")
-        n += cnt
-
-    if n:
-        x = len(conf)
-        logging.info(
-            f"Updated {n} {maybe_plural(n, 'test')} out of {s}"
-            f" after applying {x} {maybe_plural(x, 'rule')}")
+    rules_stats(stats, s, len(conf))
+    return set(k for j in used for k in [*conf[j]['update'], 'Updated by'])
 
 
-# Load YAML configuration file
-# See the README.md for details on the configuration file format.
-def load_config(filename: str) -> ConfigType:
-    # Load configuration file
+# Read YAML configuration file
+def read_config(filename: str) -> ConfigType:
     logging.debug(f'Read {filename}')
 
     with open(filename, 'r') as yamlfile:
-        y = yaml.load(yamlfile, **yaml_load_args)
+        y = yaml.load(yamlfile, Loader=SafeLoader)
         conf = cast(Optional[ConfigType], y)
 
     if conf is None:
         conf = []
 
-    logging.debug(f"{len(conf)} rule(s)")
     sanitize_yaml(conf)
     return conf
 
 
+# Load YAML configuration file
+# See the README.md for details on the configuration file format.
+# Configurations are loaded only once per process and shared.
+# The sanitized rules are cached next to the configuration file.
+# We sanitize them again when read from the cache, to warn as usual.
+@functools.lru_cache(maxsize=None)
+def load_config(filename: str) -> ConfigType:
+    conf, cached = file_cache(filename, read_config)
+
+    if cached:
+        sanitize_yaml(conf)
+
+    logging.debug(f"{len(conf)} rule(s)")
+    return cast(ConfigType, conf)
+
+
+# Compile a filter expression into a function
+# The filter is compiled only once, as the body of a function taking the test
+# `x' as argument, which is then called for each test.
+# The line break before the closing parenthesis allows comments at the end of
+# the filter.
+@functools.lru_cache(maxsize=None)
+def compile_filter(Filter: str) -> Callable[[DbEntry], bool]:
+    code = compile(f'lambda x: (\n{Filter}\n)', '<filter>', 'eval')
+    # pylint: disable=eval-used
+    return cast(Callable[[DbEntry], bool], eval(code, globals()))
+
+
+# Find the fields referred to by a "pure" filter
+# A pure filter only combines comparisons of fields `x['...']' and constants
+# with boolean logic. It has no side effect and its result only depends on the
+# fields it refers to.
+# We return the set of fields or None when the filter is not pure.
+def pure_filter_fields(Filter: str) -> Optional[set[str]]:
+    import ast  # pylint: disable=import-outside-toplevel
+
+    # Syntax nodes allowed in a filter, besides the fields and `x'
+    pure_nodes = (
+        ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not,
+        ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+        ast.In, ast.NotIn, ast.Is, ast.IsNot, ast.IfExp, ast.Constant,
+        ast.List, ast.Tuple, ast.Set, ast.Load)
+
+    try:
+        tree = ast.parse(f'(\n{Filter}\n)', mode='eval')
+    except SyntaxError:
+        return None
+
+    fields = set()
+    subscripted = set()
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript):
+            if not isinstance(node.value, ast.Name) \
+                    or not isinstance(node.slice, ast.Constant) \
+                    or not isinstance(node.slice.value, str):
+                return None
+
+            fields.add(node.slice.value)
+            subscripted.add(id(node.value))
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if node.id != 'x' or id(node) not in subscripted:
+                return None
+
+        elif not isinstance(node, (ast.Subscript, *pure_nodes)):
+            return None
+
+    return fields
+
+
+# Decide if a filter can be pushed down into the .ekl parser
+# This is possible when the filter is pure and refers only to fields coming
+# from the test set HEAD line, which no configuration rule updates. In that
+# case the filter has the same result for all the tests of a set and for the
+# set skipped entry, and the parser can drop whole test sets early.
+# We return the compiled filter or None.
+def pushdown_filter(
+        Filter: str, conf: ConfigType) -> Optional[Callable[[DbEntry], bool]]:
+    fields = pure_filter_fields(Filter)
+
+    if fields is None or not fields <= set(head_fields):
+        return None
+
+    for r in conf:
+        if 'update' in r and fields & set(r['update']):
+            return None
+
+    logging.debug('Push filter down into the parser')
+    return compile_filter(Filter)
+
+
 # Filter tests data
 # Filter is a python expression, which is evaluated for each test
 # When the expression evaluates to True, the test is kept
@@ -418,14 +697,7 @@ def load_config(filename: str) -> ConfigType:
 def filter_data(cross_check: DbType, Filter: str) -> DbType:
     logging.debug(f"Filtering with `{Filter}'")
     before = len(cross_check)
-
-    # This function "wraps" the filter and is called for each test
-    # `x' is referred to from the filter expression.
-    def function(x: DbEntry) -> bool:
-        # pylint: disable=unused-argument eval-used
-        return bool(eval(Filter))
-
-    r = list(filter(function, cross_check))
+    r = list(filter(compile_filter(Filter), cross_check))
     after = len(r)
     n = before - after
     logging.info(f"Filtered out {n} {maybe_plural(n, 'test')}, kept {after}")
@@ -435,18 +707,10 @@ def filter_data(cross_check: DbType, Filter: str) -> DbType:
 # Sort tests data in-place
 # sort_keys is a comma-separated list
 # The first key has precedence, then the second, etc.
-# To use python list in-place sorting, we use the keys in reverse order.
+# We sort only once, on a tuple of all the keys.
 def sort_data(cross_check: DbType, sort_keys: str) -> None:
     logging.debug(f"Sorting on `{sort_keys}'")
-
-    def key_func(k: str) -> Callable[[dict[str, str]], str]:
-        def func(x: dict[str, str]) -> str:
-            return x[k]
-
-        return func
-
-    for k in reversed(sort_keys.split(',')):
-        cross_check.sort(key=key_func(k))
+    cross_check.sort(key=tuple_key(sort_keys.split(',')))
 
 
 # Keep only certain fields in data, in-place
@@ -461,32 +725,56 @@ def keep_fields(cross_check: DbType, fields: str) -> None:
                 del x[k]
 
 
+# Compute the identity of a test for uniq()
+# When fields are supplied as a comma-separated list, the identity is the tuple
+# of the values of those fields, in order, with None for missing fields.
+# Otherwise it is the set of all the (field, value) pairs of the test.
+def uniq_key(fields: Optional[str]) -> Callable[[DbEntry], Hashable]:
+    if fields is None:
+        def all_items(x: DbEntry) -> Hashable:
+            return frozenset(x.items())
+
+        return all_items
+
+    k = fields.split(',')
+
+    def func(x: DbEntry) -> Hashable:
+        return tuple(x.get(i) for i in k)
+
+    return func
+
+
 # Do a "uniq" pass on the data
-# All duplicate entries are collapsed into a single one
-# We add a "count" field
-def uniq(cross_check: DbType) -> DbType:
+# All duplicate entries are collapsed into a single one, in a single pass over
+# the tests, which can be a generator.
+# We add a "count" field, which starts from the existing one, if any.
+def uniq(cross_check: Iterable[DbEntry], fields: Optional[str] = None
+         ) -> DbType:
     logging.debug("Collapsing duplicates")
+    key = uniq_key(fields)
 
-    # First pass to count all occurences
-    h: dict[str, DbEntry] = {}
+    # Remember the first occurence and count all occurences
+    first: dict[Hashable, DbEntry] = {}
+    counts: dict[Hashable, int] = {}
 
     for x in cross_check:
-        i = ''
+        i = key(x)
+        n = counts.get(i)
 
-        for k in sorted(x.keys()):
-            i += f"{k}:{x[k]} "
+        if n is None:
+            first[i] = x
+            n = int(x.get('count', 0))
 
-        if i not in h:
-            h[i] = {
-                'count': '0',
-                **x,
-            }
+        counts[i] = n + 1
 
-        # Increment count but keep it as a string.
-        h[i]['count'] = str(int(h[i]['count']) + 1)
+    # Transform back to list, with the count first
+    r = []
+
+    for i, x in first.items():
+        y = {'count': '', **x}
+        y['count'] = str(counts[i])
+        r.append(y)
 
-    # Transform back to list
-    r = list(h.values())
     logging.info(f"{len(r)} unique entries")
     return r
 
@@ -495,8 +783,11 @@ def uniq(cross_check: DbType) -> DbType:
 # The fields can be supplied as a comma-separated list
 # Order is preserved
 # Additional fields are auto-discovered and added to the list, sorted
+# When the set of fields present in the tests is already known, we do not need
+# to look at the tests.
 def discover_fields(
-        cross_check: DbType, fields: Optional[str] = None) -> list[str]:
+        cross_check: DbType, fields: Optional[str] = None,
+        known: Optional[set[str]] = None) -> list[str]:
 
     if fields is not None:
         keys = fields.split(',')
@@ -504,10 +795,13 @@ def discover_fields(
         keys = []
 
     # Find keys, not already listed
-    s: set[str] = set()
+    if known is not None:
+        s = set(known)
+    else:
+        s = set()
 
-    for x in cross_check:
-        s = s.union(x.keys())
+        for x in cross_check:
+            s.update(x.keys())
 
     s = s.difference(keys)
     keys += sorted(s)
@@ -516,64 +810,274 @@ def discover_fields(
     return keys
 
 
+# Output writer
+# Writers generate an output from the tests, which they are given one at a
+# time with write(), and must be closed in the end with close().
+# This allows to generate several outputs in a single pass, without holding
+# their whole serialized contents in memory.
+class Writer(abc.ABC):
+    @abc.abstractmethod
+    def write(self, x: DbEntry) -> None:
+        pass
+
+    @abc.abstractmethod
+    def close(self) -> None:
+        pass
+
+
+# Output file writer
+# This is a writer generating a text file; it still has to implement write().
+class FileWriter(Writer):  # pylint: disable=abstract-method
+    def __init__(self, filename: str, newline: Optional[str] = None) -> None:
+        logging.debug(f'Generate {filename}')
+        # pylint: disable=consider-using-with
+        self.f = open(filename, 'w', newline=newline)
+        self.n = 0
+
+    def close(self) -> None:
+        self.f.close()
+
+
 # Generate csv
 # The fields to write are supplied as a list
-def gen_csv(cross_check: DbType, filename: str, fields: list[str]) -> None:
-    logging.debug(f'Generate {filename} (fields: {fields})')
+class CsvWriter(FileWriter):
+    def __init__(self, filename: str, fields: list[str]) -> None:
+        import csv  # pylint: disable=import-outside-toplevel
+
+        super().__init__(filename, '')
+        logging.debug(f'Fields: {fields}')
+        self.writer = csv.DictWriter(self.f, fieldnames=fields, delimiter=';')
+        self.writer.writeheader()
 
-    with open(filename, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(
-            csvfile, fieldnames=fields, delimiter=';')
-        writer.writeheader()
-        writer.writerows(cross_check)
+    def write(self, x: DbEntry) -> None:
+        self.writer.writerow(x)
 
 
 # Generate json
-def gen_json(cross_check: DbType, filename: str) -> None:
-    logging.debug(f'Generate {filename}')
+# The output is the same as dumping the list of all the tests at once, with
+# sorted keys and an indentation of 2; we indent each test one more level.
+class JsonWriter(FileWriter):
+    def __init__(self, filename: str) -> None:
+        import json  # pylint: disable=import-outside-toplevel
+
+        super().__init__(filename)
+        self.encode = json.JSONEncoder(sort_keys=True, indent=2).encode
+
+    def write(self, x: DbEntry) -> None:
+        self.f.write('[\n  ' if not self.n else ',\n  ')
+        j = self.encode(x)
+        self.f.write(j.replace('\n', '\n  '))
+        self.n += 1
+
+    def close(self) -> None:
+        self.f.write('\n]' if self.n else '[]')
+        super().close()
+
+
+# Generate json lines
+# We output one test per line, with sorted keys.
+class JsonlWriter(FileWriter):
+    def __init__(self, filename: str) -> None:
+        import json  # pylint: disable=import-outside-toplevel
+
+        super().__init__(filename)
+        self.encode = json.JSONEncoder(sort_keys=True).encode
+
+    def write(self, x: DbEntry) -> None:
+        self.f.write(self.encode(x))
+        self.f.write('\n')
+
+
+# Generate yaml
+# We output meta-data as comments.
+# Each test is dumped as a list of one item, which gives the same output as
+# dumping the list of all the tests at once.
+class YamlWriter(FileWriter):
+    def __init__(self, filename: str, meta: MetaData) -> None:
+        super().__init__(filename)
+        yaml_meta(self.f, meta)
+
+    def write(self, x: DbEntry) -> None:
+        yaml.dump([x], self.f, Dumper=Dumper)
+        self.n += 1
+
+    def close(self) -> None:
+        if not self.n:
+            yaml.dump([], self.f, Dumper=Dumper)
+
+        super().close()
+
+
+# Quote a field name for SQL
+def sql_name(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
 
-    with open(filename, 'w') as jsonfile:
-        json.dump(cross_check, jsonfile, sort_keys=True, indent=2)
+# Convert a value for SQL
+# Values, which SQLite does not know, such as dates from YAML, are stored as
+# strings.
+def sql_value(v: Any) -> Any:
+    if v is None or isinstance(v, (str, int, float)):
+        return v
+
+    return str(v)
+
+
+# Generate an SQLite database
+# The tests are stored in a "tests" table, with one column per field, and the
+# meta-data in a "meta" table. Missing fields are stored as NULL, and fields
+# requested more than once are stored once.
+# We insert the tests in batches, and create the indexes at the end, which is
+# faster.
+class SqliteWriter(Writer):
+    # The fields to index, when present
+    indexed = ['result', 'group', 'set guid', 'guid']
+
+    def __init__(self, filename: str, fields: list[str], meta: MetaData
+                 ) -> None:
+        import sqlite3  # pylint: disable=import-outside-toplevel
+
+        logging.debug(f'Generate {filename}')
+
+        if os.path.exists(filename):
+            os.remove(filename)
+
+        self.db = sqlite3.connect(filename)
+        self.db.execute('PRAGMA synchronous = OFF')
+        self.fields = list(
+            dict.fromkeys(fields if fields else db_fields))
+        self.rows: list[tuple[Any, ...]] = []
+
+        self.db.execute(
+            f"CREATE TABLE tests ({', '.join(map(sql_name, self.fields))})")
+        self.db.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+        self.db.executemany('INSERT INTO meta VALUES (?, ?)', meta.items())
+        self.insert = \
+            f"INSERT INTO tests VALUES ({', '.join('?' * len(self.fields))})"
+
+    def flush(self) -> None:
+        self.db.executemany(self.insert, self.rows)
+        self.rows = []
+
+    def write(self, x: DbEntry) -> None:
+        self.rows.append(tuple(sql_value(x.get(f)) for f in self.fields))
+
+        if len(self.rows) >= 10000:
+            self.flush()
+
+    def close(self) -> None:
+        self.flush()
+
+        for f in self.indexed:
+            if f in self.fields:
+                self.db.execute(
+                    f'CREATE INDEX {sql_name(f"tests {f}")}'
+                    f' ON tests ({sql_name(f)})')
+
+        self.db.commit()
+        self.db.close()
+
+
+# The characters, which are not allowed in xml
+# This includes the last two code points of each plane.
+xml_illegal = [
+    (0x00, 0x08), (0x0B, 0x1F), (0x7F, 0x84), (0x86, 0x9F), (0xD800, 0xDFFF),
+    (0xFDD0, 0xFDDF),
+    *((p - 2, p - 1) for p in range(0x10000, 0x110001, 0x10000))]
+
+
+# Return the translation table escaping a string for xml
+# We escape the same characters in text and in attribute values, and we drop
+# the characters which are not allowed in xml.
+@functools.lru_cache(maxsize=None)
+def xml_table() -> dict[int, Optional[str]]:
+    t: dict[int, Optional[str]] = {
+        c: None for lo, hi in xml_illegal for c in range(lo, hi + 1)}
+
+    t.update({ord(c): f'&{e};' for c, e in [
+        ('&', 'amp'), ('<', 'lt'), ('"', 'quot'), ('>', 'gt')]})
+
+    return t
+
+
+# Escape a string for xml
+def xml_escape(v: str) -> str:
+    return v.translate(xml_table())
+
+
+# Return the junit test case of a test, in xml
+def junit_testcase(result: DbEntry) -> str:
+    name = result['name'] if result['name'] else result['sub set']
+    classname = (result['test set'] if result['test set'] else
+                 result['set guid']) + "." + result['sub set']
+    out = (
+        "Description: " + result['descr'] +
+        "\nSet GUID: " + result['set guid'] +
+        "\nGUID: " + result['guid'] +
+        "\nDevice Path: " + result['device path'] +
+        "\nStart Date: " + result['start date'] +
+        "\nStart Time: " + result['start time'] +
+        "\nRevision: " + result['revision'] +
+        "\nIteration: " + result['iteration'] +
+        "\nLog: " + result['log'])
+    r = result['result']
+    info = ''
+
+    if r == 'FAILURE':
+        info = f'\t\t\t<failure type="failure" message="{xml_escape(r)}"/>\n'
+    elif r in ('SKIPPED', 'DROPPED'):
+        info = f'\t\t\t<skipped type="skipped" message="{xml_escape(r)}"/>\n'
+
+    return (
+        f'\t\t<testcase name="{xml_escape(name)}"'
+        f' classname="{xml_escape(classname)}">\n'
+        f'{info}'
+        f'\t\t\t<system-out>{xml_escape(out)}</system-out>\n'
+        '\t\t</testcase>\n')
 
 
 # Generate junit
+# We create one test suite per group, or test set when there is no group.
+# The output is the same as with the junit-xml module, but we write the test
+# cases directly, suite by suite; only the totals are computed beforehand.
 def gen_junit(cross_check: DbType, filename: str) -> None:
-    assert 'junit_xml' in sys.modules
     logging.debug(f'Generate {filename}')
 
-    testsuites = {}
-
-    for result in cross_check:
-        testcase = TestCase(
-            result['name'] if result['name'] else result['sub set'],
-            (result['test set'] if result['test set'] else
-                result['set guid']) + "." + result['sub set'],
-            0,
-            "Description: " + result['descr'] +
-            "\nSet GUID: " + result['set guid'] +
-            "\nGUID: " + result['guid'] +
-            "\nDevice Path: " + result['device path'] +
-            "\nStart Date: " + result['start date'] +
-            "\nStart Time: " + result['start time'] +
-            "\nRevision: " + result['revision'] +
-            "\nIteration: " + result['iteration'] +
-            "\nLog: " + result['log'],
-            "")
-        if result['result'] == 'FAILURE':
-            testcase.add_failure_info(result['result'])
-        elif result['result'] == 'SKIPPED':
-            testcase.add_skipped_info(result['result'])
-        elif result['result'] == 'DROPPED':
-            testcase.add_skipped_info(result['result'])
-
-        group = result['group'] if result['group'] else result['test set']
-        if group not in testsuites:
-            testsuites[group] = TestSuite(group)
-
-        testsuites[group].test_cases.append(testcase)
+    def key(x: DbEntry) -> GroupKey:
+        return (x['group'] if x['group'] else x['test set'],)
+
+    def count(tests: DbType, results: tuple[str, ...]) -> int:
+        return sum(1 for x in tests if x['result'] in results)
+
+    suites = group_by(cross_check, key)
+    fail = ('FAILURE',)
+    skip = ('SKIPPED', 'DROPPED')
 
     with open(filename, 'w') as file:
-        TestSuite.to_file(file, testsuites.values())
+        file.write('<?xml version="1.0" ?>\n')
+
+        if not suites:
+            file.write('<testsuites/>\n')
+            return
+
+        file.write(
+            f'<testsuites disabled="0" errors="0"'
+            f' failures="{count(cross_check, fail)}"'
+            f' tests="{len(cross_check)}" time="0.0">\n')
+
+        for (group,), tests in suites.items():
+            file.write(
+                f'\t<testsuite disabled="0" errors="0"'
+                f' failures="{count(tests, fail)}" name="{xml_escape(group)}"'
+                f' skipped="{count(tests, skip)}" tests="{len(tests)}"'
+                f' time="0">\n')
+
+            for x in tests:
+                file.write(junit_testcase(x))
+
+            file.write('\t</testsuite>\n')
+
+        file.write('</testsuites>\n')
 
 
 # Write meta-data to YAML file as comments.
@@ -586,133 +1090,235 @@ def yaml_meta(f: IO[str], meta: MetaData) -> None:
     print('', file=f)
 
 
-# Generate yaml
-# We output meta-data as comments.
-def gen_yaml(cross_check: DbType, filename: str, meta: MetaData) -> None:
-    logging.debug(f'Generate {filename}')
-
-    with open(filename, 'w') as yamlfile:
-        yaml_meta(yamlfile, meta)
-        yaml.dump(cross_check, yamlfile, Dumper=Dumper)
+# The fields on which tests are grouped by the covering template
+cover_keys = ['set guid', 'guid', 'name', 'result', 'log']
 
 
-# Generate yaml config template
-# This is to help writing yaml config.
-# We omit tests with result PASS.
+# Return the template rule criteria of a test
 # We omit some tests keys: iteration and dates.
 # We remove the leading directory from C filename in log.
-# We output meta-data as comments.
-def gen_template(cross_check: DbType, filename: str, meta: MetaData) -> None:
-    logging.debug(f'Generate {filename}')
+def template_criteria(x: DbEntry) -> DbEntry:
     omitted_keys = set(['iteration', 'start date', 'start time'])
-    t = []
-    i = 1
+    crit = {}
 
-    for x in cross_check:
-        if x['result'] == 'PASS':
+    for key, value in x.items():
+        if key in omitted_keys:
             continue
 
-        r: ConfigEntry = {
-            'rule': f'Generated rule ({i})',
-            'criteria': {},
-            'update': {'result': 'TEMPLATE'},
-        }
+        if key == 'log':
+            value = re.sub(r'^/.*/', '', str(value))
 
-        for key, value in x.items():
-            if key in omitted_keys:
-                continue
+        crit[key] = value
+
+    return crit
+
+
+# Compute a minimal set of criteria covering tests
+# Tests are grouped on their cover keys, the log being normalized as in the
+# template criteria. Each group yields the criteria common to all its tests.
+# A group, whose tests all match earlier criteria, is folded into those. We
+# look for them only among the criteria of the same set guid and guid, which
+# the criteria always comprise.
+# We return the list of criteria with the number of tests each covers.
+def cover_criteria(tests: Iterable[DbEntry]) -> list[tuple[DbEntry, int]]:
+    crits = [template_criteria(x) for x in tests]
+    groups = group_by(crits, lambda c: tuple(c.get(k, '') for k in cover_keys))
+    r: list[tuple[DbEntry, int]] = []
+    earlier: dict[GroupKey, list[int]] = {}
+
+    for k, g in groups.items():
+        e = earlier.setdefault(k[:2], [])
 
-            if key == 'log':
-                value = re.sub(r'^/.*/', '', str(value))
+        for j in e:
+            if all(matches_crit(c, r[j][0]) for c in g):
+                r[j] = r[j][0], r[j][1] + len(g)
+                break
+        else:
+            crit = {
+                f: v for f, v in g[0].items()
+                if all(c.get(f) == v for c in g)}
+            e.append(len(r))
+            r.append((crit, len(g)))
+
+    return r
+
+
+# Generate yaml config template
+# This is to help writing yaml config.
+# We omit tests with result PASS.
+# With cover, we generate a minimal set of rules covering the tests, with the
+# number of tests each rule covers as a comment, instead of one rule per test.
+# We output meta-data as comments.
+def gen_template(
+        cross_check: DbType, filename: str, meta: MetaData,
+        cover: bool = False) -> None:
 
-            r['criteria'][key] = value
+    logging.debug(f'Generate {filename}')
+    tests = [x for x in cross_check if x['result'] != 'PASS']
 
-        t.append(r)
-        i += 1
+    if cover:
+        crits = cover_criteria(tests)
+    else:
+        crits = [(template_criteria(x), 1) for x in tests]
 
     with open(filename, 'w') as yamlfile:
         yaml_meta(yamlfile, meta)
-        yaml.dump(t, yamlfile, Dumper=Dumper)
+
+        if not crits:
+            yaml.dump([], yamlfile, Dumper=Dumper)
+
+        for i, (crit, n) in enumerate(crits, start=1):
+            r: ConfigEntry = {
+                'rule': f'Generated rule ({i})',
+                'criteria': crit,
+                'update': {'result': 'TEMPLATE'},
+            }
+
+            if cover:
+                print(f"# Covers {n} {maybe_plural(n, 'test')}", file=yamlfile)
+
+            yaml.dump([r], yamlfile, Dumper=Dumper)
+
+    if cover:
+        logging.info(
+            f"Generated {len(crits)} {maybe_plural(len(crits), 'rule')}"
+            f" covering {len(tests)} {maybe_plural(len(tests), 'test')}")
 
 
 # Print to stdout
 # The fields to write are supplied as a list
 # We handle the case where not all fields are present for all records
-def do_print(cross_check: DbType, fields: list[str]) -> None:
-    logging.debug(f'Print (fields: {fields})')
-
-    # First pass to find the width for each field
+# The width of each field is computed on the first print_sample tests only, so
+# that printing starts immediately. Longer values are truncated, as well as
+# values longer than width, unless it is zero. We print at most limit tests,
+# unless it is None.
+def do_print(
+        cross_check: Iterable[DbEntry], fields: list[str],
+        limit: Optional[int] = None, width: int = 0) -> None:
+
+    logging.debug(f'Print (fields: {fields}, limit: {limit}, width: {width})')
+    it = itertools.islice(cross_check, limit)
+    sample = list(itertools.islice(it, print_sample))
+
+    # Find the width for each field on the sample
     w = {}
 
     for f in fields:
         w[f] = len(f)
 
-    for x in cross_check:
+    for x in sample:
         for f in fields:
             w[f] = max(w[f], len(str(x[f]) if f in x else ''))
 
-    # Second pass where we print
+    if width:
+        for f in fields:
+            w[f] = min(w[f], width)
+
+    def cut(r: str, n: int) -> str:
+        return r if len(r) <= n else f"{r[:n - 1]}…"
+
+    def fit(v: Any, n: int) -> str:
+        return cut(f"{v:{n}}", n)
+
+    # Print the sample and the rest, as they come
     fm1 = fields[:len(fields) - 1]
     lf = fields[len(fields) - 1]
-    sep = '  '
 
-    print(sep.join([
-        *map(lambda f: f"{f.capitalize():{w[f]}}", fm1),
-        lf.capitalize()]))
+    def last(v: Any) -> str:
+        return cut(str(v), width) if width else str(v)
 
-    print(sep.join([*map(lambda f: '-' * w[f], fields)]))
+    print('  '.join([
+        *map(lambda f: fit(f.capitalize(), w[f]), fm1),
+        last(lf.capitalize())]))
 
-    def map_func(x: dict[str, str]) -> Callable[[str], str]:
-        def func(f: str) -> str:
-            return f"{x[f] if f in x else '':{w[f]}}"
+    print('  '.join([*map(lambda f: '-' * w[f], fields)]))
 
-        return func
+    for x in itertools.chain(sample, it):
+        print('  '.join([
+            *(fit(x[f] if f in x else '', w[f]) for f in fm1),
+            last(x[lf] if lf in x else '')]))
 
-    for x in cross_check:
-        print(sep.join([*map(map_func(x), fm1), x[lf] if lf in x else '']))
 
+# Run the pager on stdout, when enabled and stdout is a terminal
+# The pager is taken from the PAGER environment variable, like git does.
+# We stop quietly when the pager exits before the end.
+@contextlib.contextmanager
+def pager(enabled: bool) -> Iterator[None]:
+    cmd = os.environ.get('PAGER', 'less -FRSX')
 
-# Combine or two databases db1 and db2 coming from ekl and seq files
-# respectively into a single cross_check database
-# Tests in db1, which were not meant to be run according to db2 have their
-# results forced to SPURIOUS.
-# Tests sets in db2, which were not run according to db1 have an artificial
-# test entry created with result DROPPED.
-def combine_dbs(db1: DbType, db2: DbType) -> DbType:
-    cross_check = db1
+    if not enabled or not cmd or cmd == 'cat' or not sys.stdout.isatty():
+        yield
+        return
+
+    import shlex  # pylint: disable=import-outside-toplevel
+    import subprocess  # pylint: disable=import-outside-toplevel
+
+    try:
+        p = subprocess.Popen(
+            shlex.split(cmd), stdin=subprocess.PIPE, text=True)
+    except OSError as e:
+        logging.warning(f"{yellow}Cannot run pager{normal} `{cmd}': {e}")
+        yield
+        return
+
+    assert p.stdin is not None
+
+    try:
+        with contextlib.redirect_stdout(p.stdin):
+            yield
+    except BrokenPipeError:
+        pass
+    finally:
+        # Closing flushes, which fails too when the pager has exited.
+        with contextlib.suppress(OSError):
+            p.stdin.close()
+
+        p.wait()
 
-    # Do a pass to verify that all tests in db1 were meant to be run.
-    # Otherwise, force the result to SPURIOUS.
+
+# Verify that all tests in db1 were meant to be run according to db2, while
+# they go through. Otherwise, force their result to SPURIOUS.
+# We add the set guids of the tests to seen, as the test sets, which did run.
+def mark_spurious(
+        db1: Iterable[DbEntry], db2: DbType,
+        seen: set[str]) -> Iterator[DbEntry]:
     s = set()
 
     for x in db2:
         s.add(x['guid'])
 
     n = 0
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
 
-    for i, x in enumerate(cross_check):
+    for i, x in enumerate(db1):
         if x['set guid'] not in s:
-            logging.debug(f"Spurious test {i} `{cross_check[i]['name']}'")
+            if debug:
+                logging.debug(f"Spurious test {i} `{x['name']}'")
+
             x['result'] = 'SPURIOUS'
             n += 1
 
+        seen.add(x['set guid'])
+        yield x
+
     if n:
         logging.debug(f'{n} spurious test(s)')
 
-    # Do a pass to find the test sets that did not run for whatever reason.
-    s = set()
-
-    for x in cross_check:
-        s.add(x['set guid'])
 
+# Find the test sets in db2, which did not run for whatever reason
+# We yield an artificial test entry with result DROPPED for each test set,
+# which is not in seen.
+def dropped_sets(db2: DbType, seen: set[str]) -> Iterator[DbEntry]:
     n = 0
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
 
     for i, x in enumerate(db2):
-        if not x['guid'] in s:
-            logging.debug(f"Dropped test set {i} `{x['name']}'")
+        if not x['guid'] in seen:
+            if debug:
+                logging.debug(f"Dropped test set {i} `{x['name']}'")
 
             # Create an artificial test entry to reflect the dropped test set
-            cross_check.append({
+            yield {
                 'descr': '',
                 'device path': '',
                 'guid': '',
@@ -727,33 +1333,63 @@ def combine_dbs(db1: DbType, db2: DbType) -> DbType:
                 'revision': x['rev'],
                 'group': 'Unknown',
                 'result': 'DROPPED',
-            })
+            }
 
             n += 1
 
     if n:
         logging.debug(f'{n} dropped test set(s)')
 
-    return cross_check
+
+# Combine or two databases db1 and db2 coming from ekl and seq files
+# respectively into a single cross_check database, which we yield test by test
+# Tests in db1, which were not meant to be run according to db2 have their
+# results forced to SPURIOUS.
+# Tests sets in db2, which were not run according to db1 have an artificial
+# test entry created with result DROPPED.
+# db1 is consumed only once, in order, and can therefore be a generator.
+# The test sets in pruned did run but their tests were dropped by the parser;
+# they are not reported as dropped.
+def combine_dbs(
+        db1: Iterable[DbEntry], db2: DbType,
+        pruned: Optional[set[str]] = None) -> Iterator[DbEntry]:
+    # Remember the test sets, which did run.
+    # The pruned set is filled as we consume db1, so we refer to it at the end.
+    seen: set[str] = set()
+    yield from mark_spurious(db1, db2, seen)
+
+    if pruned:
+        logging.debug(f'{len(pruned)} test set(s) pruned by filter')
+        seen |= pruned
+
+    yield from dropped_sets(db2, seen)
 
 
 # Verify Sanity of our YAML seq db
 def sanity_check_seq_db(seq_db: SeqDb) -> None:
     assert 'seq_db' in seq_db
+    # Each kind of hash must be unique on its own; a normalized sequence file
+    # has the same sha256 and nsha256.
     s = set()
+    ns = set()
 
     for x in seq_db['seq_files']:
         sha = x['sha256']
         assert sha not in s
         s.add(sha)
 
+        if 'nsha256' in x:
+            sha = x['nsha256']
+            assert sha not in ns
+            ns.add(sha)
+
 
 # Load the database of known sequence files.
 def load_seq_db(filename: str) -> SeqDb:
     logging.debug(f'Read {filename}')
 
     with open(filename, 'r') as yamlfile:
-        y = yaml.load(yamlfile, **yaml_load_args)
+        y = yaml.load(yamlfile, Loader=SafeLoader)
         seq_db = cast(Optional[SeqDb], y)
 
     if seq_db is None:
@@ -764,72 +1400,458 @@ def load_seq_db(filename: str) -> SeqDb:
     return seq_db
 
 
+# Build the index of a database of known sequence files
+def index_seq_db(seq_db: SeqDb) -> SeqIndex:
+    index: SeqIndex = {'sha256': {}, 'nsha256': {}}
+
+    for x in seq_db['seq_files']:
+        index['sha256'][x['sha256']] = x
+
+        if 'nsha256' in x:
+            index['nsha256'][x['nsha256']] = x
+
+    return index
+
+
+# Load the index of the database of known sequence files.
+# The index is cached; see file_cache().
+# The index is loaded only once per process and shared.
+@functools.lru_cache(maxsize=None)
+def load_seq_index(filename: str) -> SeqIndex:
+    index, _ = file_cache(filename, lambda f: index_seq_db(load_seq_db(f)))
+    return cast(SeqIndex, index)
+
+
+# Guess the encoding of a .seq file from its first bytes
+# Files are normally encoded in utf-16 with a BOM. We also accept utf-8 with a
+# BOM. Without BOM, we assume little endian utf-16 when the second byte is
+# null, as for an ascii character, and utf-8 otherwise; the latter is the
+# encoding of normalized files.
+def bom_encoding(data: bytes) -> str:
+    if data.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+
+    if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+
+    if data[1:2] == b'\0':
+        return 'utf-16-le'
+
+    return 'utf-8'
+
+
+# Compute the sha256 of a .seq file and of its normalized contents
+# We read the file in chunks. The normalized contents are the text decoded
+# from utf-16 (or utf-8, see bom_encoding()), without BOM and with unix
+# line endings, encoded in utf-8. This allows to identify files differing only
+# in BOM or line endings.
+def hash_seq(filename: str) -> tuple[str, str]:
+    import hashlib  # pylint: disable=import-outside-toplevel
+
+    raw = hashlib.sha256()
+    norm = hashlib.sha256()
+    dec: Optional[codecs.IncrementalDecoder] = None
+    carry = ''
+
+    with open(filename, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            raw.update(chunk)
+
+            if dec is None:
+                enc = bom_encoding(chunk)
+                dec = codecs.getincrementaldecoder(enc)(errors='replace')
+
+            t = carry + dec.decode(chunk)
+            carry = ''
+
+            # Keep a trailing CR, which could be followed by a LF.
+            if t.endswith('\r'):
+                carry = '\r'
+                t = t[:-1]
+
+            t = t.replace('\r\n', '\n').replace('\r', '\n')
+            norm.update(t.encode())
+
+    if dec is not None:
+        t = carry + dec.decode(b'', True)
+        norm.update(t.replace('\r', '\n').encode())
+
+    return raw.hexdigest(), norm.hexdigest()
+
+
 # Try to identify the .seq file in a list of known versions using its sha256.
+# When this fails, we try again with the sha256 of its normalized contents.
 # We return the identified seq_db entry or None.
 def ident_seq(seq_file: str, seq_db_name: str) -> Optional[SeqFile]:
-    seq_db = load_seq_db(seq_db_name)
+    index = load_seq_index(seq_db_name)
 
     # Hash seq file
-    hm = 'sha256'
-    hl = hashlib.new(hm)
+    h, nh = hash_seq(seq_file)
+    logging.debug(f'sha256 {h} nsha256 {nh} {seq_file}')
 
-    with open(seq_file, 'rb') as f:
-        hl.update(f.read())
+    # Try to identify the seq file
+    if h in index['sha256']:
+        x = index['sha256'][h]
+    elif nh in index['nsha256']:
+        x = index['nsha256'][nh]
+        logging.debug('Identified with normalized contents')
+    else:
+        logging.warning(
+            f"{yellow}Could not identify{normal} `{seq_file}'...")
+        return None
 
-    h = hl.hexdigest()
-    logging.debug(f'{hm} {h} {seq_file}')
+    logging.info(
+        f"""{green}Identified{normal} `{seq_file}'"""
+        f""" as "{x['name']}".""")
 
-    # Try to identify the seq file
-    for x in seq_db['seq_files']:
-        if x['sha256'] == h:
-            logging.info(
-                f"""{green}Identified{normal} `{seq_file}'"""
-                f""" as "{x['name']}".""")
+    if 'deprecated' in x:
+        logging.warning(
+            f"{yellow}This sequence file is deprecated!{normal}")
 
-            if 'deprecated' in x:
-                logging.warning(
-                    f"{yellow}This sequence file is deprecated!{normal}")
+    return x
 
-            return x
 
-    logging.warning(f"{yellow}Could not identify{normal} `{seq_file}'...")
-    return None
+# Read the .seq file
+# We return "database 2": all test sets that should run.
+def read_seq_file(seq_file: str) -> DbType:
+    logging.debug(f'Read {seq_file}')
 
+    # files are encoded in utf-16, normally with a BOM
+    with open(seq_file, 'rb') as f:
+        enc = bom_encoding(f.read(4))
+
+    with open(seq_file, "r", encoding=enc) as f:
+        db2 = seq_parser(f)
+
+    logging.debug(f"{len(db2)} test set(s)")
+    return db2
+
+
+# Read the .seq file and the .ekl log file and combine them into a single
+# database, which we yield test by test.
+# The log is decoded and parsed incrementally, which keeps memory usage bounded
+# regardless of its size.
+def iter_log_and_seq(
+        log_file: str, seq_file: str,
+        keep: Optional[Callable[[DbEntry], bool]] = None
+        ) -> Iterator[DbEntry]:
+    # seq file to open
+    db2 = read_seq_file(seq_file)
 
-# Read the .ekl log file and the .seq file and combine them into a single
-# database, which we return.
-def read_log_and_seq(log_file: str, seq_file: str) -> DbType:
     # ekl file to open
     # "database 1" all tests.
     logging.debug(f'Read {log_file}')
 
     # files are encoded in utf-16
-    with open(log_file, "r", encoding="utf-16") as f:
-        db1 = ekl_parser(f.readlines())
+    # Produce a single cross_check database from our two db1 and db2
+    # databases.
+    pruned: set[str] = set()
+    yield from combine_dbs(
+        ekl_parser(decode_lines(log_file, 'utf-16'), keep, pruned), db2,
+        pruned)
 
-    logging.debug(f"{len(db1)} test(s)")
 
-    # seq file to open
-    # "database 2" all test sets that should run
-    logging.debug(f'Read {seq_file}')
+# Read a text file and return an iterator on its lines
+# We read and decode the file in chunks, and account this to the decode_input
+# stage when profiling, separately from the processing of the lines; see
+# stage_part(). As when iterating on the file, line endings are translated,
+# but the lines we return do not end with a newline.
+def decode_lines(filename: str, encoding: str) -> Iterator[str]:
+    return itertools.chain.from_iterable(decode_chunks(filename, encoding))
+
+
+# Read a text file in chunks, and yield lists of its lines
+# See decode_lines().
+def decode_chunks(filename: str, encoding: str) -> Iterator[list[str]]:
+    rest = ''
+
+    with open(filename, 'r', encoding=encoding) as f:
+        while True:
+            with stage_part('decode_input') as p:
+                t = f.read(1 << 19)
+                lines = (rest + t).split('\n')
+                rest = lines.pop()
+                p['records'] = len(lines)
+
+            yield lines
+
+            if not t:
+                break
+
+    if rest:
+        yield [rest]
+
+
+# Read the .ekl log file and the .seq file and combine them into a single
+# database, which we return.
+def read_log_and_seq(log_file: str, seq_file: str) -> DbType:
+    return list(iter_log_and_seq(log_file, seq_file))
+
+
+# Follow a growing .ekl log file, and yield its complete test sets
+# Every interval seconds, we read and decode the data appended to the file.
+# After each chunk we read, we yield the lines of all the test sets completed
+# by a TERM line as a list; the lines of the current test set are kept for
+# later. This holds at most a chunk and a test set in memory, even when we
+# start on a large log.
+# We stop when the file has not grown for idle seconds, and yield the lines we
+# still have.
+def follow_log(
+        log_file: str, interval: float, idle: float) -> Iterator[list[str]]:
+    logging.debug(f'Follow {log_file}')
 
     # files are encoded in utf-16
-    with open(seq_file, "r", encoding="utf-16") as f:
-        db2 = seq_parser(f)
+    dec = codecs.getincrementaldecoder('utf-16')(errors='replace')
+    rest = ''
+    last = time.monotonic()
 
-    logging.debug(f"{len(db2)} test set(s)")
+    with open(log_file, 'rb') as f:
+        while True:
+            chunk = f.read(1 << 20)
+
+            if not chunk:
+                if time.monotonic() - last >= idle:
+                    break
+
+                time.sleep(interval)
+                continue
+
+            rest += dec.decode(chunk)
+            last = time.monotonic()
+            i = rest.rfind('\n|TERM')
+            j = rest.find('\n', i + 1) if i >= 0 else -1
+
+            if j >= 0:
+                yield rest[:j].split('\n')
+                rest = rest[j + 1:]
+
+    rest += dec.decode(b'', True)
+
+    if rest:
+        yield rest.split('\n')
 
-    # Produce a single cross_check database from our two db1 and db2 databases.
-    return combine_dbs(db1, db2)
+
+# Compute the sha256 of a file
+# We read the file in chunks, to hash large files in constant memory.
+def hash_file(filename: str) -> str:
+    import hashlib  # pylint: disable=import-outside-toplevel
+
+    hl = hashlib.sha256()
+
+    with open(filename, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            hl.update(chunk)
+
+    return hl.hexdigest()
+
+
+# Return a version of the parser, suitable for cache invalidation
+# We use the sha256 of our own source, as any change can affect parsing.
+@functools.lru_cache(maxsize=None)
+def parser_version() -> str:
+    return hash_file(os.path.realpath(__file__))
+
+
+# Load an object from a cache file
+# We return None when the file does not exist or cannot be loaded.
+def cache_load(filename: str) -> Any:
+    try:
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.debug(f"Ignoring cache `{filename}': {e!r}")
+        return None
+
+
+# Store an object into a cache file
+# We write a temporary file first and rename it, so that concurrent readers
+# never see a partial file; the temporary file is removed on error. Errors are
+# not fatal, and we warn about them only when warn is True.
+def cache_store(filename: str, obj: Any, warn: bool = True) -> None:
+    import tempfile  # pylint: disable=import-outside-toplevel
+
+    tmp = None
+
+    try:
+        d = os.path.dirname(filename) or '.'
+        os.makedirs(d, exist_ok=True)
+
+        with tempfile.NamedTemporaryFile(
+                'wb', dir=d, prefix='.tmp', delete=False) as f:
+            tmp = f.name
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(tmp, filename)
+        tmp = None
+    except (OSError, pickle.PicklingError) as e:
+        m = f"Could not write cache `{filename}': {e}"
+
+        if warn:
+            logging.warning(f"{yellow}{m}{normal}")
+        else:
+            logging.debug(m)
+    finally:
+        if tmp is not None:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+
+
+# The folder of the caches of file_cache(), when set by init_file_cache().
+# Otherwise we use the user cache folder; see user_cache_dir().
+file_cache_dir: Optional[str] = None
+
+
+# Set the folder of the caches of file_cache()
+def init_file_cache(cache_dir: Optional[str]) -> None:
+    # pylint: disable=global-statement
+    global file_cache_dir
+    file_cache_dir = cache_dir
+
+
+# Return the user cache folder of the parser
+# This is $XDG_CACHE_HOME/sct-parser, or ~/.cache/sct-parser by default.
+def user_cache_dir() -> str:
+    d = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+
+    return os.path.join(d, 'sct-parser')
+
+
+# Return the cache filename of a file for file_cache()
+# Caches are not stored next to their files, which could be in a read-only
+# folder, but in a cache folder. Their names are made unique with the hash of
+# the file real path.
+def file_cache_name(filename: str) -> str:
+    import hashlib  # pylint: disable=import-outside-toplevel
+
+    d = file_cache_dir if file_cache_dir is not None else user_cache_dir()
+    p = os.path.realpath(filename)
+    h = hashlib.sha256(p.encode()).hexdigest()[:16]
+    return os.path.join(d, f'{os.path.basename(p)}.{h}.cache')
+
+
+# Build an object from a file, using a cache
+# The cache is a file with the .cache suffix in a cache folder (see
+# file_cache_name()), keyed by the parser version and the file sha256. It is
+# valid as long as the file modification time and size are unchanged or,
+# failing that, as long as its sha256 is unchanged.
+# We do not cache special files, such as /dev/null.
+# We return the object and whether it was read from the cache.
+def file_cache(
+        filename: str, build: Callable[[str], Any]) -> tuple[Any, bool]:
+    st = os.stat(filename)
+
+    if not stat.S_ISREG(st.st_mode):
+        return build(filename), False
+
+    cache = file_cache_name(filename)
+    stamp = {'mtime': st.st_mtime_ns, 'size': st.st_size}
+    c = cache_load(cache)
+    h = None
+
+    if isinstance(c, dict) and c.get('version') == parser_version():
+        if c['stamp'] == stamp:
+            logging.debug(f'Read {cache}')
+            return c['data'], True
+
+        h = hash_file(filename)
+
+        if c['sha256'] == h:
+            logging.debug(f'Read {cache}')
+            cache_store(cache, {**c, 'stamp': stamp}, False)
+            return c['data'], True
+
+    data = build(filename)
+
+    cache_store(cache, {
+        'version': parser_version(),
+        'stamp': stamp,
+        'sha256': h if h is not None else hash_file(filename),
+        'data': data,
+    }, False)
+
+    return data, False
+
+
+# Read the .ekl log file and the .seq file and combine them into a single
+# database, using a cache in folder cache_dir.
+# The cache is addressed by the sha256 of the .ekl and .seq contents and by
+# the parser version. Cached databases are stored before rules application.
+def cached_log_and_seq(
+        log_file: str, seq_file: str, cache_dir: str) -> DbType:
+    import hashlib  # pylint: disable=import-outside-toplevel
+
+    k = hashlib.sha256(
+        f"{hash_file(log_file)} {hash_file(seq_file)} {parser_version()}"
+        .encode()).hexdigest()
+
+    filename = os.path.join(cache_dir, f'{k}.db')
+    db = cache_load(filename)
+
+    if db is not None:
+        logging.debug(f"Read {len(db)} test(s) from cache `{filename}'")
+        return cast(DbType, db)
+
+    db = read_log_and_seq(log_file, seq_file)
+    logging.debug(f"Write {len(db)} test(s) to cache `{filename}'")
+    cache_store(filename, db)
+    return db
+
+
+# Return the folder of the shards of a markdown summary
+def md_shards_dir(md: str) -> str:
+    return f'{os.path.splitext(md)[0]}.d'
+
+
+# Generate the shards of a section of a sharded markdown summary
+# We write one shard per group, for the tests of result k, in section n, and
+# a table of the groups linking to the shards in the summary file.
+def gen_md_shards(
+        file: IO[str], md: str, n: int, k: str, tests: DbType) -> None:
+    d = md_shards_dir(md)
+    h = group_by(tests, tuple_key(['group']))
+    index = []
+
+    for j, g in enumerate(sorted(h.keys()), start=1):
+        name = re.sub(r'[^\w.-]+', '_', f'{n}.{j}-{g[0]}.md')
+        logging.debug(f'Generate {name}')
+
+        with open(os.path.join(d, name), 'w') as shardfile:
+            shardfile.write(f"# SCT {k.title()}: {g[0]}\n\n")
+            shardfile.write(
+                f"[Summary](../{os.path.basename(md)})\n\n### {g[0]}")
+            dict_2_md(h[g], shardfile)
+
+        index.append({
+            'Group': f'[{g[0]}]({os.path.basename(d)}/{name})',
+            'Test(s)': str(len(h[g])),
+        })
+
+    dict_2_md(index, file)
 
 
 # generate MD summary
+# With shards, the tests tables are written in separate files, one per result
+# and group, in a folder next to the summary, and the summary links to them.
 # We output meta-data
 def gen_md(
-        md: str, res_keys: set[str], bins: BinsType, meta: MetaData) -> None:
+        md: str, res_keys: set[str], bins: BinsType, meta: MetaData,
+        shards: bool = False) -> None:
 
     logging.debug(f'Generate {md}')
 
+    if shards:
+        import glob  # pylint: disable=import-outside-toplevel
+
+        d = md_shards_dir(md)
+        os.makedirs(d, exist_ok=True)
+
+        # Remove stale shards
+        for f in glob.glob(os.path.join(glob.escape(d), '*.*-*.md')):
+            os.remove(f)
+
     with open(md, 'w') as resultfile:
         resultfile.write("# SCT Summary\n\n")
         resultfile.write("|Result|Test(s)|\n")
@@ -848,8 +1870,14 @@ def gen_md(
         res_keys_np.remove('PASS')
 
         for k in sorted(res_keys_np):
-            resultfile.write(f"## {n}. {k.title()} by group\n\n")
-            key_tree_2_md(bins[k], resultfile)
+            resultfile.write(f"## {n}. {k.title()} by group")
+
+            if shards:
+                gen_md_shards(resultfile, md, n, k, bins[k])
+            else:
+                resultfile.write("\n\n")
+                key_tree_2_md(bins[k], resultfile)
+
             n += 1
 
         # Meta-data
@@ -861,9 +1889,74 @@ def gen_md(
             resultfile.write(f"|{k}:|{meta[k]}|\n")
 
 
+# Return the filename of the data of a markdown summary
+def md_data_name(md: str) -> str:
+    return f'{md}.jsonl.gz'
+
+
+# Generate the data of a markdown summary
+# This is a gzip-compressed JSON Lines file, next to the markdown. Its first
+# line holds the format version, the sha256 of the markdown and the meta-data.
+# Then come all the tests with all their fields, which allows to re-read the
+# results losslessly with --input-md.
+def gen_md_data(md: str, cross_check: DbType, meta: MetaData) -> None:
+    import gzip  # pylint: disable=import-outside-toplevel
+    import json  # pylint: disable=import-outside-toplevel
+
+    filename = md_data_name(md)
+    logging.debug(f'Generate {filename}')
+    enc = json.JSONEncoder(ensure_ascii=False).encode
+
+    with gzip.open(filename, 'wt', compresslevel=1) as f:
+        f.write(enc({
+            'version': md_data_version,
+            'md-sha256': hash_file(md),
+            'meta': meta,
+        }))
+        f.write('\n')
+
+        for x in cross_check:
+            f.write(enc(x))
+            f.write('\n')
+
+
+# Read back results from the data of a markdown summary
+# We make sure that the data is for this version of the markdown, which could
+# have been generated or modified without it.
+# We return the tests or None.
+def read_md_data(input_md: str) -> Optional[DbType]:
+    import gzip  # pylint: disable=import-outside-toplevel
+    import json  # pylint: disable=import-outside-toplevel
+
+    filename = md_data_name(input_md)
+
+    if not os.path.isfile(filename):
+        return None
+
+    with gzip.open(filename, 'rt') as f:
+        h = json.loads(f.readline())
+
+        if h.get('version') != md_data_version \
+                or h.get('md-sha256') != hash_file(input_md):
+            logging.warning(
+                f"{yellow}Ignoring stale{normal} `{filename}'")
+            return None
+
+        logging.debug(f'Read {filename}')
+        return [json.loads(x) for x in f]
+
+
 # Read back results from a previously generated summary markdown file.
-# From this, we re-create a database the best we can and we return it.
+# When it has its data next to it, we read all the tests from there.
+# Otherwise, we re-create a database from the markdown the best we can; this
+# loses the tests with result PASS and the fields not in the tables.
+# We return the tests.
 def read_md(input_md: str) -> DbType:
+    db = read_md_data(input_md)
+
+    if db is not None:
+        return db
+
     logging.debug(f'Read {input_md}')
     tables = []
 
@@ -943,245 +2036,1638 @@ def print_summary(bins: BinsType, res_keys: set[str]) -> None:
     logging.info(', '.join(map(lambda k: d[k], sorted(res_keys))))
 
 
-# Return a dict with the initial meta-data.
-def meta_data(argv: list[str], here: str) -> MetaData:
-    r: MetaData = {
-        'command-line': ' '.join(argv),
-        'date': f"{time.asctime(time.gmtime())} UTC",
-    }
+# Describe the test set of a test, for a comparison between two runs
+def set_entry(x: DbEntry) -> DbEntry:
+    return {k: x[k] for k in ['group', 'test set', 'sub set', 'set guid']}
 
-    cp = subprocess.run(
-        f"git -C '{here}' describe --always --abbrev=12 --dirty", shell=True,
-        capture_output=True, check=False)
-    logging.debug(cp)
 
-    if cp.returncode:
-        logging.debug('No git')
-    else:
-        r['git-commit'] = cp.stdout.decode().rstrip()
+# Describe a test, for a comparison between two runs
+# Either the baseline test b or the test x can be None.
+def diff_entry(b: Optional[DbEntry], x: Optional[DbEntry]) -> DbEntry:
+    t = x if x is not None else b
+    assert t is not None
 
-    logging.debug(f"meta-data: {r}")
-    return r
+    return {
+        **set_entry(t),
+        'name': t['name'],
+        'guid': t['guid'],
+        'baseline': b['result'] if b is not None else '',
+        'result': x['result'] if x is not None else '',
+    }
 
 
-# Perform some sanity checks on the tests:
-# - We verify that the tests have all the fields we need.
-def sanity_check(cross_check: DbType) -> None:
-    fields = [
-        'descr',
-        'device path',
-        'guid',
-        'iteration',
-        'log',
-        'name',
-        'start date',
-        'start time',
-        'test set',
-        'sub set',
-        'set guid',
-        'revision',
-        'group',
-        'result',
-    ]
+# Return the test sets, which did run, with their first test
+def run_sets(cross_check: DbType) -> dict[str, DbEntry]:
+    r: dict[str, DbEntry] = {}
 
     for x in cross_check:
-        for f in fields:
-            assert f in x
+        if x['result'] != 'DROPPED':
+            r.setdefault(x['set guid'], x)
 
+    return r
 
-if __name__ == '__main__':
-    me = os.path.realpath(__file__)
-    here = os.path.dirname(me)
-    parser = argparse.ArgumentParser(
-        description='Process SCT results.'
-                    ' This program takes the SCT summary and sequence files,'
-                    ' and generates a nice report in mardown format.',
-        epilog='When sorting is requested, tests data are sorted'
-               ' according to the first sort key, then the second, etc.'
-               ' Sorting happens after update by the configuration rules.'
-               ' Useful example: --sort'
-               ' "group,descr,set guid,test set,sub set,guid,name,log"'
-               ' When not validating a configuration file, an input .ekl and'
-               ' an input .seq files are required.',
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument('--csv', help='Output .csv filename')
-    parser.add_argument('--json', help='Output .json filename')
 
-    # junit-xml modules must of been loaded to enable the --junit option
-    if 'junit_xml' in sys.modules:
-        parser.add_argument('--junit', help='Output .junit filename')
+# Tell if a test is an artificial entry for a dropped or skipped test set
+def is_placeholder(x: DbEntry) -> bool:
+    return x['result'] in ('DROPPED', 'SKIPPED') and not x['guid'] \
+        and not x['name']
 
-    parser.add_argument(
-        '--md', help='Output .md filename', default='result.md')
-    parser.add_argument(
-        '--debug', action='store_true', help='Turn on debug messages')
-    parser.add_argument(
-        '--sort', help='Comma-separated list of keys to sort output on')
-    parser.add_argument('--filter', help='Python expression to filter results')
-    parser.add_argument(
-        '--fields', help='Comma-separated list of fields to write')
-    parser.add_argument(
-        '--uniq', action='store_true', help='Collapse duplicates')
-    parser.add_argument(
-        '--print', action='store_true', help='Print results to stdout')
-    parser.add_argument(
-        '--print-meta', action='store_true', help='Print meta-data to stdout')
-    parser.add_argument('--input-md', help='Input .md filename')
-    parser.add_argument(
-        '--seq-db', help='Known sequence files database filename',
-        default=f'{here}/seq_db.yaml')
-    parser.add_argument('log_file', nargs='?', help='Input .ekl filename')
-    parser.add_argument('seq_file', nargs='?', help='Input .seq filename')
-    parser.add_argument('find_key', nargs='?', help='Search key')
-    parser.add_argument('find_value', nargs='?', help='Search value')
-    parser.add_argument('--config', help='Input .yaml configuration filename')
-    parser.add_argument('--yaml', help='Output .yaml filename')
-    parser.add_argument(
-        '--template', help='Output .yaml config template filename')
-    args = parser.parse_args()
 
-    logging.basicConfig(
-        format='%(levelname)s %(funcName)s: %(message)s',
-        level=logging.DEBUG if args.debug else logging.INFO)
+# Compare the tests of a run with the tests of a baseline run
+# We join the tests on their identity with a hash map, in a single pass over
+# each run. Tests with the same identity are paired in order of appearance.
+# The artificial entries of dropped or skipped test sets are not tests; the
+# dropped sets are reported with the test sets.
+# New failures and fixed tests are also result changes.
+# We return a dict of lists of differences, indexed by kind; see diff_kinds.
+def diff_runs(base: DbType, cross_check: DbType) -> BinsType:
+    key = tuple_key(diff_keys)
+    h = group_by((y for y in base if not is_placeholder(y)), key)
+    paired: dict[GroupKey, int] = {}
+    d: BinsType = {k: [] for k in diff_kinds}
 
-    ln = logging.getLevelName(logging.WARNING)
-    logging.addLevelName(logging.WARNING, f"{yellow}{ln}{normal}")
-    ln = logging.getLevelName(logging.ERROR)
-    logging.addLevelName(logging.ERROR, f"{red}{ln}{normal}")
+    for x in cross_check:
+        if is_placeholder(x):
+            continue
 
-    # We must have a log file and a seq file.
-    if args.log_file is None:
-        logging.error("No input .ekl!")
-        sys.exit(1)
-    if args.seq_file is None:
-        logging.error("No input .seq!")
-        sys.exit(1)
+        k = key(x)
+        b = h.get(k)
+        i = paired.get(k, 0)
 
-    # First part of configuration selection: command line, or default.
-    # We need to do this early for the case of config validation.
-    if args.config is not None:
-        config = args.config
-    else:
-        config = f'{here}/EBBR.yaml'
+        if b is None or i >= len(b):
+            d['added tests'].append(diff_entry(None, x))
 
-    # Prepare initial meta-data.
-    meta = meta_data(sys.argv, here)
+            if x['result'] == 'FAILURE':
+                d['new failures'].append(diff_entry(None, x))
 
-    if args.input_md is not None:
-        cross_check = read_md(args.input_md)
-        ident = None
-    else:
-        # Command line argument 1 is the ekl file to open.
-        # Command line argument 2 is the seq file to open.
+            continue
 
-        # Try to identify the sequence file
-        ident = ident_seq(args.seq_file, args.seq_db)
+        paired[k] = i + 1
+        y = b[i]
 
-        if ident is not None:
-            meta['seq-file-ident'] = ident['name']
+        if y['result'] == x['result']:
+            continue
 
-        # Read both and combine them into a single cross_check database.
-        cross_check = read_log_and_seq(args.log_file, args.seq_file)
+        d['result changes'].append(diff_entry(y, x))
 
-    logging.debug(f"{len(cross_check)} combined test(s)")
+        if x['result'] == 'FAILURE':
+            d['new failures'].append(diff_entry(y, x))
+        elif y['result'] == 'FAILURE':
+            d['fixed'].append(diff_entry(y, x))
 
-    # Perform some sanity checks on the tests.
-    sanity_check(cross_check)
+    for k, b in h.items():
+        for y in b[paired.get(k, 0):]:
+            d['removed tests'].append(diff_entry(y, None))
 
-    # Second part of configuration file selection: take autodetect into account
-    # but with less priority than command line.
-    if args.config is None and ident is not None:
-        config = f"{here}/{ident['config']}"
+    s1 = run_sets(base)
+    s2 = run_sets(cross_check)
+    d['added test sets'] = [
+        set_entry(x) for g, x in s2.items() if g not in s1]
+    d['removed test sets'] = [
+        set_entry(x) for g, x in s1.items() if g not in s2]
 
-    # Take configuration file into account. This can perform transformations on
-    # the tests results.
-    logging.debug(f"Read config `{config}'")
-    conf = load_config(config)
-    apply_rules(cross_check, conf)
+    return d
 
-    # Filter tests data, if requested
-    if args.filter is not None:
-        cross_check = filter_data(cross_check, args.filter)
 
-    # Sort tests data in-place, if requested
-    if args.sort is not None:
-        sort_data(cross_check, args.sort)
+# Print a one-line summary of the comparison with a baseline run
+def print_diff_summary(d: BinsType) -> None:
+    colors = {
+        'new failures': red,
+        'fixed': green,
+        'removed test sets': yellow,
+    }
 
-    # search for failures, warnings, passes & others
-    # We detect all present keys in additions to the expected ones. This is
-    # handy with config rules overriding the result field
-    # with arbitrary values.
-    res_keys = set(['DROPPED', 'FAILURE', 'WARNING', 'PASS'])
+    r = []
 
-    for x in cross_check:
-        res_keys.add(x['result'])
+    for k in diff_kinds:
+        n = len(d[k])
+        r.append(f'{k}: {n}')
 
-    # Now we fill some bins with tests according to their result
-    bins = {}
+        if n > 0 and k in colors:
+            r[-1] = f'{colors[k]}{r[-1]}{normal}'
 
-    for k in res_keys:
-        bins[k] = key_value_find(cross_check, "result", k)
+    logging.info(f"Compared to baseline: {', '.join(r)}")
 
-    # Print a one-line summary
-    print_summary(bins, res_keys)
 
-    # Print meta-data
-    if args.print_meta:
-        print()
-        print('meta-data')
-        print('---------')
-        for k in sorted(meta.keys()):
-            print(f"{k}: {meta[k]}")
+# Generate the markdown report of the comparison with a baseline run
+# We output meta-data
+def gen_diff_md(filename: str, d: BinsType, meta: MetaData) -> None:
+    logging.debug(f'Generate {filename}')
 
-    # generate MD summary
-    # As a special case, we skip generation when we are reading from a markdown
-    # summary, which has the same name as the output.
-    if args.input_md is None or args.input_md != args.md:
-        gen_md(args.md, res_keys, bins, meta)
+    with open(filename, 'w') as resultfile:
+        resultfile.write("# SCT Diff\n\n")
+        resultfile.write("|Difference|Count|\n")
+        resultfile.write("|--|--|\n")
 
-    # Generate yaml config template if requested
-    if args.template is not None:
-        gen_template(cross_check, args.template, meta)
+        for k in diff_kinds:
+            resultfile.write(f"|{k.capitalize()}:|{len(d[k])}|\n")
 
-    # Filter fields before writing any other type of output
+        resultfile.write("\n\n")
+
+        # Sections listing the differences, when there are some
+        n = 1
+
+        for k in diff_kinds:
+            if not d[k]:
+                continue
+
+            resultfile.write(f"## {n}. {k.capitalize()}")
+            dict_2_md(d[k], resultfile)
+            n += 1
+
+        # Meta-data
+        resultfile.write('## Meta-data\n\n')
+        resultfile.write("|  |  |\n")
+        resultfile.write("|--|--|\n")
+
+        for k in sorted(meta.keys()):
+            resultfile.write(f"|{k}:|{meta[k]}|\n")
+
+
+# Describe the git commit of the parser
+# When installed from a git tree, the description can be embedded in a
+# .git-commit file next to the parser; see `make git-commit'. Otherwise we ask
+# git, once per process.
+# We return None when this is not possible.
+@functools.lru_cache(maxsize=None)
+def git_commit(here: str) -> Optional[str]:
+    try:
+        with open(f'{here}/.git-commit', 'r') as f:
+            logging.debug(f'Read {here}/.git-commit')
+            return f.read().rstrip()
+    except OSError:
+        pass
+
+    import subprocess  # pylint: disable=import-outside-toplevel
+
+    try:
+        cp = subprocess.run(
+            ['git', '-C', here, 'describe', '--always', '--abbrev=12',
+             '--dirty'],
+            capture_output=True, check=False)
+    except OSError as e:
+        logging.debug(f'No git: {e}')
+        return None
+
+    logging.debug(cp)
+
+    if cp.returncode:
+        logging.debug('No git')
+        return None
+
+    return cp.stdout.decode().rstrip()
+
+
+# Return a dict with the initial meta-data.
+def meta_data(argv: list[str], here: str) -> MetaData:
+    r: MetaData = {
+        'command-line': ' '.join(argv),
+        'date': f"{time.asctime(time.gmtime())} UTC",
+    }
+
+    c = git_commit(here)
+
+    if c is not None:
+        r['git-commit'] = c
+
+    logging.debug(f"meta-data: {r}")
+    return r
+
+
+# The fields of all the tests
+db_fields = [
+    'descr',
+    'device path',
+    'guid',
+    'iteration',
+    'log',
+    'name',
+    'start date',
+    'start time',
+    'test set',
+    'sub set',
+    'set guid',
+    'revision',
+    'group',
+    'result',
+]
+
+
+# Perform some sanity checks on the tests:
+# - We verify that the tests have all the fields we need.
+def sanity_check(cross_check: DbType) -> None:
+    for x in cross_check:
+        for f in db_fields:
+            assert f in x
+
+
+# Columnar database
+# As an alternative to a list of dicts, the tests data can be stored as one
+# column per field. Low-cardinality fields are dictionary-encoded: each row
+# holds a small integer code, which refers to a list of distinct values. This
+# saves memory and allows to evaluate criteria once per distinct value.
+# Missing fields are stored as None. Each row also refers to its "shape": the
+# tuple of its fields, in order. This makes conversion back to dicts lossless.
+
+# The fields, which we dictionary-encode
+dict_fields = set([
+    'descr',
+    'device path',
+    'group',
+    'iteration',
+    'result',
+    'revision',
+    'set guid',
+    'start date',
+    'sub set',
+    'test set',
+    'Updated by',
+    'comments',
+])
+
+
+# A plain column, holding one value per row
+class PlainColumn:
+    def __init__(self, n: int) -> None:
+        self.data: list[Optional[str]] = [None] * n
+
+    def append(self, v: Optional[str]) -> None:
+        self.data.append(v)
+
+    def get(self, i: int) -> Optional[str]:
+        return self.data[i]
+
+    def put(self, i: int, v: Optional[str]) -> None:
+        self.data[i] = v
+
+    def take(self, rows: Iterable[int]) -> 'PlainColumn':
+        c = PlainColumn(0)
+        c.data = [self.data[i] for i in rows]
+        return c
+
+    # Return the rows, which value contains the string v
+    def matching(self, v: str, rows: Iterable[int]) -> list[int]:
+        d = self.data
+        return [i for i in rows if (x := d[i]) is not None and v in x]
+
+
+# A dictionary-encoded column
+# Code 0 is reserved for None.
+class DictColumn:
+    def __init__(self, n: int) -> None:
+        self.codes = array.array('I', [0]) * n
+        self.values: list[Optional[str]] = [None]
+        self.lookup: dict[Optional[str], int] = {None: 0}
+
+    # Return the code of value v, allocating it if necessary
+    def code(self, v: Optional[str]) -> int:
+        c = self.lookup.get(v)
+
+        if c is None:
+            c = len(self.values)
+            self.values.append(v)
+            self.lookup[v] = c
+
+        return c
+
+    def append(self, v: Optional[str]) -> None:
+        self.codes.append(self.code(v))
+
+    def get(self, i: int) -> Optional[str]:
+        return self.values[self.codes[i]]
+
+    def put(self, i: int, v: Optional[str]) -> None:
+        self.codes[i] = self.code(v)
+
+    def take(self, rows: Iterable[int]) -> 'DictColumn':
+        c = DictColumn(0)
+        c.values = list(self.values)
+        c.lookup = dict(self.lookup)
+        codes = self.codes
+        c.codes = array.array('I', (codes[i] for i in rows))
+        return c
+
+    # Return the set of codes, which value contains the string v
+    # We evaluate each distinct value only once.
+    def matching_codes(self, v: str) -> set[int]:
+        return set(
+            c for c, x in enumerate(self.values) if x is not None and v in x)
+
+    # Return the rows, which value contains the string v
+    def matching(self, v: str, rows: Iterable[int]) -> list[int]:
+        s = self.matching_codes(v)
+
+        if not s:
+            return []
+
+        codes = self.codes
+        return [i for i in rows if codes[i] in s]
+
+    # Return the rows for each code, in a single pass
+    def group_rows(self) -> dict[int, list[int]]:
+        r: dict[int, list[int]] = {}
+
+        for i, c in enumerate(self.codes):
+            r.setdefault(c, []).append(i)
+
+        return r
+
+
+Column = PlainColumn | DictColumn
+
+
+# The columnar database itself
+class ColumnarDb:
+    def __init__(self) -> None:
+        self.n = 0
+        self.columns: dict[str, Column] = {}
+        self.shape_codes = array.array('I')
+        self.shapes: list[tuple[str, ...]] = []
+        self.shape_lookup: dict[tuple[str, ...], int] = {}
+
+    def __len__(self) -> int:
+        return self.n
+
+    # Return the column for field k, creating it if necessary
+    def column(self, k: str) -> Column:
+        if k not in self.columns:
+            self.columns[k] = \
+                DictColumn(self.n) if k in dict_fields else PlainColumn(self.n)
+
+        return self.columns[k]
+
+    # Return the code of a shape, allocating it if necessary
+    def shape_code(self, shape: tuple[str, ...]) -> int:
+        c = self.shape_lookup.get(shape)
+
+        if c is None:
+            c = len(self.shapes)
+            self.shapes.append(shape)
+            self.shape_lookup[shape] = c
+
+        return c
+
+    def append(self, x: DbEntry) -> None:
+        for k, v in x.items():
+            self.column(k).append(v)
+
+        for k, c in self.columns.items():
+            if k not in x:
+                c.append(None)
+
+        self.shape_codes.append(self.shape_code(tuple(x.keys())))
+        self.n += 1
+
+    @classmethod
+    def from_dicts(cls, db: Iterable[DbEntry]) -> 'ColumnarDb':
+        r = cls()
+
+        for x in db:
+            r.append(x)
+
+        return r
+
+    # Return row i as a dict
+    def row(self, i: int) -> DbEntry:
+        r = {}
+        columns = self.columns
+
+        for k in self.shapes[self.shape_codes[i]]:
+            v = columns[k].get(i)
+            assert v is not None
+            r[k] = v
+
+        return r
+
+    # Convert the whole database back to a list of dicts
+    def to_dicts(self) -> DbType:
+        return [self.row(i) for i in range(self.n)]
+
+    # Replace row i with the dict x
+    def set_row(self, i: int, x: DbEntry) -> None:
+        for k in self.shapes[self.shape_codes[i]]:
+            if k not in x:
+                self.columns[k].put(i, None)
+
+        for k, v in x.items():
+            self.column(k).put(i, v)
+
+        self.shape_codes[i] = self.shape_code(tuple(x.keys()))
+
+    # Update row i with the dict u, like dict.update() would
+    def update_row(self, i: int, u: DbEntry) -> None:
+        shape = self.shapes[self.shape_codes[i]]
+
+        for k, v in u.items():
+            self.column(k).put(i, v)
+
+        new = tuple(k for k in u.keys() if k not in shape)
+
+        if new:
+            self.shape_codes[i] = self.shape_code(shape + new)
+
+    # Return a new database with only the given rows, in that order
+    def take(self, rows: Iterable[int]) -> 'ColumnarDb':
+        rows = list(rows)
+        r = ColumnarDb()
+        r.n = len(rows)
+        r.columns = {k: c.take(rows) for k, c in self.columns.items()}
+        r.shapes = list(self.shapes)
+        r.shape_lookup = dict(self.shape_lookup)
+        sc = self.shape_codes
+        r.shape_codes = array.array('I', (sc[i] for i in rows))
+        return r
+
+    # Return the rows for each value of field k, in a single pass
+    def group_rows(self, k: str) -> dict[Optional[str], list[int]]:
+        c = self.column(k)
+
+        if isinstance(c, DictColumn):
+            return {c.values[x]: r for x, r in c.group_rows().items()}
+
+        h: dict[Optional[str], list[int]] = {}
+
+        for i, v in enumerate(c.data):
+            h.setdefault(v, []).append(i)
+
+        return h
+
+
+# Perform some sanity checks on the tests of a columnar database
+# We verify the shapes only, as they describe the fields of all the rows.
+def sanity_check_columnar(cdb: ColumnarDb) -> None:
+    used = set(cdb.shape_codes)
+
+    for c in used:
+        for f in db_fields:
+            assert f in cdb.shapes[c]
+
+
+# Find the candidate rows for a rule criteria in a columnar database
+# We use the most selective dictionary-encoded criteria, with the rows grouped
+# by code, which we compute lazily and remember in groups.
+# We return None when no criteria allows to narrow down the rows.
+def candidate_rows(
+        cdb: ColumnarDb, crit: DbEntry, groups: dict[str, dict[int, list[int]]]
+        ) -> Optional[list[int]]:
+
+    rows: Optional[list[int]] = None
+
+    for k, v in crit.items():
+        if k not in cdb.columns:
+            return []
+
+        c = cdb.columns[k]
+
+        if not isinstance(c, DictColumn):
+            continue
+
+        if k not in groups:
+            groups[k] = c.group_rows()
+
+        g = groups[k]
+        cand = sorted(i for x in c.matching_codes(v) for i in g.get(x, []))
+
+        if rows is None or len(cand) < len(rows):
+            rows = cand
+
+    return rows
+
+
+# Apply all configuration rules to the tests of a columnar database
+# We modify cdb in-place, with the same result as apply_rules().
+# Rules are evaluated one at a time, in configuration order, on the rows not
+# yet matched. This preserves first-match-wins semantics.
+# The criteria of a rule are evaluated column by column, on its candidate rows.
+# Only matched rows are updated, which keeps the rows grouped by code valid for
+# all unmatched rows.
+def apply_rules_columnar(cdb: ColumnarDb, conf: ConfigType) -> None:
+    stats = {}
+
+    for r in conf:
+        stats[r['rule']] = 0
+
+    s = len(cdb)
+    matched = bytearray(s)
+    groups: dict[str, dict[int, list[int]]] = {}
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+    for r in conf:
+        crit = r['criteria']
+        rows = candidate_rows(cdb, crit, groups)
+
+        if rows is None:
+            rows = list(range(s))
+
+        rows = [i for i in rows if not matched[i]]
+
+        for k, v in crit.items():
+            if not rows:
+                break
+
+            rows = cdb.columns[k].matching(v, rows)
+
+        rule = r['rule']
+        u = {**r['update'], 'Updated by': rule}
+
+        for i in rows:
+            if debug:
+                logging.debug(f"Applying rule `{rule}' to test {i}")
+
+            cdb.update_row(i, u)
+            matched[i] = 1
+
+        stats[rule] += len(rows)
+
+    # Statistics
+    rules_stats(stats, s, len(conf))
+
+
+# Filter tests data of a columnar database
+# Like filter_data(), the filter expression is evaluated for each test as dict
+# `x'. Modifications of x by the expression are written back.
+def filter_columnar(cdb: ColumnarDb, Filter: str) -> ColumnarDb:
+    logging.debug(f"Filtering with `{Filter}'")
+    before = len(cdb)
+    keep = []
+    function = compile_filter(Filter)
+
+    for i in range(before):
+        x = cdb.row(i)
+        y = dict(x)
+
+        if function(x):
+            keep.append(i)
+
+        if list(x.items()) != list(y.items()):
+            cdb.set_row(i, x)
+
+    r = cdb.take(keep)
+    after = len(r)
+    n = before - after
+    logging.info(f"Filtered out {n} {maybe_plural(n, 'test')}, kept {after}")
+    return r
+
+
+# Sort tests data of a columnar database
+# sort_keys is a comma-separated list, as for sort_data()
+# We sort the rows indices once on a tuple of the columns values and return a
+# new database.
+def sort_columnar(cdb: ColumnarDb, sort_keys: str) -> ColumnarDb:
+    logging.debug(f"Sorting on `{sort_keys}'")
+    keys = sort_keys.split(',')
+    columns = [cdb.column(k) for k in keys]
+
+    def key_func(i: int) -> tuple[str, ...]:
+        r = []
+
+        for k, c in zip(keys, columns):
+            v = c.get(i)
+
+            if v is None:
+                raise KeyError(k)
+
+            r.append(v)
+
+        return tuple(r)
+
+    return cdb.take(sorted(range(len(cdb)), key=key_func))
+
+
+# Fill bins with tests according to their result, from a columnar database
+# The rows are grouped on the result column codes, and cross_check are the
+# rows already converted to dicts.
+def bin_results_columnar(cdb: ColumnarDb, cross_check: DbType) -> BinsType:
+    bins: BinsType = {k: [] for k in ['DROPPED', 'FAILURE', 'WARNING', 'PASS']}
+
+    for k, rows in cdb.group_rows('result').items():
+        assert k is not None
+        bins[k] = [cross_check[i] for i in rows]
+
+    return bins
+
+
+# The profile of a stage of a run
+# Times are in seconds and memory sizes in bytes. The rss is the maximum
+# resident set size of the process at the end of the stage, and peak is the
+# peak of memory allocated during the stage, when tracing memory.
+class StageProfile(TypedDict):
+    wall: float
+    cpu: float
+    records: int
+    rss: int
+    peak: int
+
+
+# The profiles of the stages of the current run, by stage name, when profiling
+# is enabled. See init_profile().
+profiles: Optional[dict[str, StageProfile]] = None
+profile_memory = False
+
+# The wall-clock and CPU times accounted to stage parts so far. See
+# stage_part().
+part_times = [0.0, 0.0]
+
+
+# Enable profiling
+# With memory, we also trace memory allocations, which is slower.
+def init_profile(memory: bool) -> None:
+    # pylint: disable=global-statement
+    global profiles, profile_memory
+    profiles = {}
+    profile_memory = memory
+
+    if memory:
+        import tracemalloc  # pylint: disable=import-outside-toplevel
+
+        tracemalloc.start()
+
+
+# Profile a stage of a run
+# This is a context manager, which yields the stage profile. The number of
+# records processed by the stage can be given or updated in the profile.
+# When profiling is disabled, this does nothing.
+@contextlib.contextmanager
+def stage(name: str, records: int = 0) -> Iterator[StageProfile]:
+    p: StageProfile = {
+        'wall': 0, 'cpu': 0, 'records': records, 'rss': 0, 'peak': 0}
+
+    if profiles is None:
+        yield p
+        return
+
+    import tracemalloc  # pylint: disable=import-outside-toplevel
+
+    if profile_memory:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    w = time.perf_counter() - part_times[0]
+    c = time.process_time() - part_times[1]
+    yield p
+    p['wall'] = time.perf_counter() - part_times[0] - w
+    p['cpu'] = time.process_time() - part_times[1] - c
+    p['rss'] = max_rss()
+
+    if profile_memory:
+        p['peak'] = max(0, tracemalloc.get_traced_memory()[1] - base)
+
+    profiles[name] = p
+
+
+# Profile a part of a stage, which can be entered many times
+# This is a context manager like stage(), which yields the profile of the part.
+# It is added to the profile of the stage, and its times are excluded from the
+# stage around it. This allows to profile separately the stages, which run
+# interleaved in a pipeline, such as decoding and parsing the input. We do not
+# trace memory here.
+@contextlib.contextmanager
+def stage_part(name: str) -> Iterator[StageProfile]:
+    p: StageProfile = {'wall': 0, 'cpu': 0, 'records': 0, 'rss': 0, 'peak': 0}
+
+    if profiles is None:
+        yield p
+        return
+
+    w = time.perf_counter()
+    c = time.process_time()
+
+    try:
+        yield p
+    finally:
+        w = time.perf_counter() - w
+        c = time.process_time() - c
+        part_times[0] += w
+        part_times[1] += c
+        s = profiles.setdefault(name, {
+            'wall': 0, 'cpu': 0, 'records': 0, 'rss': 0, 'peak': 0})
+        s['wall'] += w
+        s['cpu'] += c
+        s['records'] += p['records']
+        s['rss'] = max_rss()
+
+
+# Return the maximum resident set size of the process, in bytes
+# getrusage() reports it in bytes on macOS, and in KiB on Linux and others.
+def max_rss() -> int:
+    import resource  # pylint: disable=import-outside-toplevel
+
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return int(r if sys.platform == 'darwin' else r * 1024)
+
+
+# Print the profiles of the stages of a run
+def print_profile(profiles: dict[str, StageProfile]) -> None:
+    print()
+    print(f"{'stage':<16} {'records':>9} {'wall (s)':>9} {'cpu (s)':>9}"
+          f" {'rss (MiB)':>10} {'peak (MiB)':>10}")
+    print(f"{'-' * 16} {'-' * 9} {'-' * 9} {'-' * 9} {'-' * 10} {'-' * 10}")
+
+    for k, p in profiles.items():
+        print(f"{k:<16} {p['records']:>9} {p['wall']:>9.3f} {p['cpu']:>9.3f}"
+              f" {p['rss'] / 2**20:>10.1f} {p['peak'] / 2**20:>10.1f}")
+
+
+# The input files of a run, and its configuration filename or None for
+# autodetection.
+class Run(TypedDict):
+    name: str
+    log: str
+    seq: str
+    config: Optional[str]
+
+
+# Read the input of a single run
+# We read the .ekl and .seq files, or the input markdown.
+# We also load the configuration, as the filter may be pushed down into the
+# parser when the configuration allows it.
+# We return the tests data, which may be a generator, and the configuration.
+def read_input(
+        args: argparse.Namespace, here: str, meta: MetaData, run: Run
+        ) -> tuple[Iterable[DbEntry], ConfigType]:
+
+    if args.input_md is not None:
+        return read_md(args.input_md), read_run_config(here, run, None)
+
+    conf = identify_run(args, here, meta, run)
+
+    # Read both and combine them into a single cross_check database.
+    # The cache holds all the tests, so we do not push the filter down then.
+    if args.cache_dir is not None:
+        db = cached_log_and_seq(run['log'], run['seq'], args.cache_dir)
+        return db, conf
+
+    keep = None
+
+    if args.filter is not None:
+        keep = pushdown_filter(args.filter, conf)
+
+    return iter_log_and_seq(run['log'], run['seq'], keep), conf
+
+
+# Identify the sequence file of a run and load its configuration
+# We record the identified sequence file in the meta-data.
+def identify_run(
+        args: argparse.Namespace, here: str, meta: MetaData, run: Run
+        ) -> ConfigType:
+
+    # Try to identify the sequence file
+    ident = ident_seq(run['seq'], args.seq_db)
+
+    if ident is not None:
+        meta['seq-file-ident'] = ident['name']
+
+    return read_run_config(here, run, ident)
+
+
+# Select the configuration filename of a run
+# The selection is done in the following order: run configuration,
+# autodetected configuration or default.
+def run_config(here: str, run: Run, ident: Optional[SeqFile]) -> str:
+    if run['config'] is not None:
+        return run['config']
+
+    if ident is not None:
+        return f"{here}/{ident['config']}"
+
+    return f'{here}/EBBR.yaml'
+
+
+# Load the configuration of a run
+def read_run_config(
+        here: str, run: Run, ident: Optional[SeqFile]) -> ConfigType:
+    config = run_config(here, run, ident)
+    logging.debug(f"Read config `{config}'")
+    return load_config(config)
+
+
+# Read the results of a single run
+# We read the run input, apply the configuration, filter and sort as requested
+# in args.
+# We return the resulting database, and the set of its fields when we know it
+# without looking at the tests, or None.
+def read_run(
+        args: argparse.Namespace, here: str, meta: MetaData, run: Run
+        ) -> tuple[DbType, Optional[set[str]]]:
+
+    with stage('parse_input') as p:
+        db, conf = read_input(args, here, meta, run)
+        cross_check = list(db)
+        p['records'] = len(cross_check)
+
+    logging.debug(f"{len(cross_check)} combined test(s)")
+
+    # Perform some sanity checks on the tests.
+    with stage('sanity_check', len(cross_check)):
+        sanity_check(cross_check)
+
+    # Take configuration file into account. This can perform transformations on
+    # the tests results.
+    with stage('apply_rules', len(cross_check)):
+        known: Optional[set[str]] = \
+            set(db_fields) | apply_rules(cross_check, conf)
+
+    # A markdown input may have more fields, and we know nothing from no test
+    if args.input_md is not None or not cross_check:
+        known = None
+
+    # Filter tests data, if requested
+    # The filter may add fields.
+    if args.filter is not None:
+        with stage('filter_data', len(cross_check)):
+            cross_check = filter_data(cross_check, args.filter)
+
+        known = None
+
+    # Sort tests data in-place, if requested
+    if args.sort is not None:
+        with stage('sort_data', len(cross_check)):
+            sort_data(cross_check, args.sort)
+
+    return cross_check, known
+
+
+# Take new tests of a followed run into account
+# We check the new tests and apply the configuration and the filter requested
+# in args to them, before adding them to cross_check and to the bins.
+# We return the set of fields added or modified by the rules.
+def follow_update(
+        args: argparse.Namespace, conf: ConfigType, cross_check: DbType,
+        bins: BinsType, new: DbType) -> set[str]:
+
+    logging.debug(f"{len(new)} new test(s)")
+    sanity_check(new)
+    used = apply_rules(new, conf)
+
+    if args.filter is not None:
+        new = filter_data(new, args.filter)
+
+    cross_check += new
+
+    for x in new:
+        bins.setdefault(x['result'], []).append(x)
+
+    return used
+
+
+# Rate limit a costly periodic action
+# We return a function, which runs func again only once ratio times its last
+# duration has elapsed since it ended; this bounds the share of the time spent
+# in it.
+def throttle(ratio: float, func: Callable[[], None]) -> Callable[[], None]:
+    end = -math.inf
+    duration = 0.0
+
+    def run() -> None:
+        nonlocal end, duration
+        t = time.monotonic()
+
+        if t - end < ratio * duration:
+            return
+
+        func()
+        end = time.monotonic()
+        duration = end - t
+
+    return run
+
+
+# Follow a single run, while its .ekl log file is growing
+# We parse the test sets as they complete and update the summary after each
+# batch of new tests. The markdown is updated too, but throttled, as its cost
+# grows with the run. Once the log stops growing (or we are
+# interrupted), we add the dropped test sets and sort as requested in args.
+# We return the same as read_run().
+def follow_run(
+        args: argparse.Namespace, here: str, meta: MetaData, run: Run
+        ) -> tuple[DbType, Optional[set[str]]]:
+
+    conf = identify_run(args, here, meta, run)
+    db2 = read_seq_file(run['seq'])
+    keep = None
+
+    if args.filter is not None:
+        keep = pushdown_filter(args.filter, conf)
+
+    # The test sets pruned by the parser did run; we add them to seen.
+    seen: set[str] = set()
+    cross_check: DbType = []
+    bins = bin_results([])
+    known = set(db_fields)
+    update_md = throttle(
+        follow_md_ratio, functools.partial(write_md, args, meta, bins, None))
+    first = 0
+
+    try:
+        for lines in follow_log(
+                run['log'], args.follow_interval, args.follow_idle):
+            new = list(mark_spurious(
+                ekl_parser(lines, keep, seen, first), db2, seen))
+            first += len(lines)
+            known |= follow_update(args, conf, cross_check, bins, new)
+            print_summary(bins, set(bins.keys()))
+            update_md()
+
+    except KeyboardInterrupt:
+        logging.warning(f"{yellow}Interrupted{normal} while following")
+
+    known |= follow_update(
+        args, conf, cross_check, bins, list(dropped_sets(db2, seen)))
+
+    if args.sort is not None:
+        sort_data(cross_check, args.sort)
+
+    if args.filter is not None or not cross_check:
+        return cross_check, None
+
+    return cross_check, known
+
+
+# Read the results of a single run into a columnar database
+# This is the same as read_run(), with all the steps done column-at-a-time.
+def read_run_columnar(
+        args: argparse.Namespace, here: str, meta: MetaData, run: Run
+        ) -> ColumnarDb:
+
+    with stage('parse_input') as p:
+        db, conf = read_input(args, here, meta, run)
+        cdb = ColumnarDb.from_dicts(db)
+        p['records'] = len(cdb)
+
+    logging.debug(f"{len(cdb)} combined test(s)")
+
+    with stage('sanity_check', len(cdb)):
+        sanity_check_columnar(cdb)
+
+    with stage('apply_rules', len(cdb)):
+        apply_rules_columnar(cdb, conf)
+
+    if args.filter is not None:
+        with stage('filter_data', len(cdb)):
+            cdb = filter_columnar(cdb, args.filter)
+
+    if args.sort is not None:
+        with stage('sort_data', len(cdb)):
+            cdb = sort_columnar(cdb, args.sort)
+
+    return cdb
+
+
+# Fill bins with tests according to their result
+# We detect all present keys in additions to the expected ones. This is
+# handy with config rules overriding the result field with arbitrary values.
+# The tests are binned in a single pass.
+def bin_results(cross_check: DbType) -> BinsType:
+    # search for failures, warnings, passes & others
+    bins: BinsType = {k: [] for k in ['DROPPED', 'FAILURE', 'WARNING', 'PASS']}
+
+    for (k,), tests in group_by(cross_check, tuple_key(['result'])).items():
+        bins[k] = tests
+
+    return bins
+
+
+# Print meta-data to stdout
+def print_meta(meta: MetaData) -> None:
+    print()
+    print('meta-data')
+    print('---------')
+
+    for k in sorted(meta.keys()):
+        print(f"{k}: {meta[k]}")
+
+
+# Print the tests matching a key & value search to stdout
+def print_found(cross_check: DbType, key: str, value: str) -> None:
+    print_found_tests(key_value_find(cross_check, key, value), key)
+
+
+# Print the tests found by a search on key to stdout
+def print_found_tests(found: DbType, key: str) -> None:
+    # print the dict
+    print("found:", len(found), "items with search constraints")
+
+    for x in found:
+        print(x["guid"], ":", x["name"], "with", key, ":", x[key])
+
+
+# Return the output filename for name, in folder outdir if not None
+def out_name(name: Optional[str], outdir: Optional[str]) -> Optional[str]:
+    if name is None or outdir is None:
+        return name
+
+    return os.path.join(outdir, os.path.basename(name))
+
+
+# Generate the markdown summary of a single run
+# When outdir is not None, the outputs are written in that folder; this is
+# also true for the other outputs below.
+def write_md(
+        args: argparse.Namespace, meta: MetaData, bins: BinsType,
+        outdir: Optional[str]) -> None:
+
+    # generate MD summary
+    # As a special case, we skip generation when we are reading from a markdown
+    # summary, which has the same name as the output.
+    md = out_name(args.md, outdir)
+    assert md is not None
+
+    if args.input_md is None or args.input_md != md:
+        gen_md(md, set(bins.keys()), bins, meta, args.md_shards)
+
+
+# Generate the data of the markdown summary of a single run, when requested
+# We skip generation when the markdown is not a regular file, such as
+# /dev/stdout, or when we skipped the markdown generation.
+def write_md_data(
+        args: argparse.Namespace, meta: MetaData, cross_check: DbType,
+        outdir: Optional[str]) -> None:
+
+    if not args.md_data:
+        return
+
+    md = out_name(args.md, outdir)
+    assert md is not None
+
+    if (args.input_md is None or args.input_md != md) \
+            and os.path.isfile(md):
+        gen_md_data(md, cross_check, meta)
+
+
+# Open the writers of the requested outputs
+def open_writers(
+        args: argparse.Namespace, meta: MetaData, fields: list[str],
+        outdir: Optional[str]) -> list[Writer]:
+
+    writers: list[Writer] = []
+
+    # Generate csv if requested
+    csv_name = out_name(args.csv, outdir)
+
+    if csv_name is not None:
+        writers.append(CsvWriter(csv_name, fields))
+
+    # Generate json if requested
+    json_name = out_name(args.json, outdir)
+
+    if json_name is not None:
+        writers.append(JsonWriter(json_name))
+
+    # Generate json lines if requested
+    jsonl_name = out_name(args.jsonl, outdir)
+
+    if jsonl_name is not None:
+        writers.append(JsonlWriter(jsonl_name))
+
+    # Generate yaml if requested
+    yaml_name = out_name(args.yaml, outdir)
+
+    if yaml_name is not None:
+        writers.append(YamlWriter(yaml_name, meta))
+
+    # Generate sqlite if requested
+    sqlite_name = out_name(args.sqlite, outdir)
+
+    if sqlite_name is not None:
+        writers.append(SqliteWriter(sqlite_name, fields, meta))
+
+    return writers
+
+
+# Write all the tests with writers, and close them
+def write_all(writers: list[Writer], cross_check: DbType) -> None:
+    try:
+        for x in cross_check:
+            for w in writers:
+                w.write(x)
+
+    finally:
+        for w in writers:
+            w.close()
+
+
+# Generate all the other outputs requested in args
+# known is the set of the fields of the tests, when known, or None.
+# The csv, json, json lines and yaml outputs are written in a single pass.
+# We may modify cross_check in-place.
+def write_outputs(
+        args: argparse.Namespace, meta: MetaData, cross_check: DbType,
+        known: Optional[set[str]], outdir: Optional[str]) -> None:
+
+    # Generate yaml config template if requested
+    template = out_name(args.template, outdir)
+
+    if template is not None:
+        with stage('gen_template', len(cross_check)):
+            gen_template(cross_check, template, meta, args.template_cover)
+
+    # Filter fields before writing any other type of output
     # Do not rely on specific fields being present after this step
     if args.fields is not None:
-        keep_fields(cross_check, args.fields)
+        with stage('keep_fields', len(cross_check)):
+            keep_fields(cross_check, args.fields)
+
+        if known is not None:
+            known &= set(args.fields.split(','))
 
     # Do a `uniq` pass if requested
     if args.uniq:
-        cross_check = uniq(cross_check)
+        with stage('uniq', len(cross_check)):
+            cross_check = uniq(cross_check, args.fields)
+
+        if known is not None:
+            known.add('count')
 
     # Auto-discover the fields and take the option into account
-    fields = discover_fields(cross_check, args.fields)
+    fields = discover_fields(cross_check, args.fields, known)
 
-    # Generate csv if requested
-    if args.csv is not None:
-        gen_csv(cross_check, args.csv, fields)
+    # Generate csv, json, json lines and yaml if requested
+    writers = open_writers(args, meta, fields, outdir)
 
-    # Generate json if requested
-    if args.json is not None:
-        gen_json(cross_check, args.json)
+    if writers:
+        with stage('writers', len(cross_check)):
+            write_all(writers, cross_check)
 
     # Generate junit if requested
-    if 'junit' in args and args.junit is not None:
-        gen_junit(cross_check, args.junit)
+    junit = out_name(args.junit, outdir)
 
-    # Generate yaml if requested
-    if args.yaml is not None:
-        gen_yaml(cross_check, args.yaml, meta)
+    if junit is not None:
+        with stage('gen_junit', len(cross_check)):
+            gen_junit(cross_check, junit)
 
     # Print if requested
     if args.print:
-        do_print(cross_check, fields)
+        with stage('do_print', len(cross_check)), pager(not args.no_pager):
+            do_print(cross_check, fields, args.limit, args.print_width)
 
     # command line argument 3&4, key are to support a key & value search.
     # these will be displayed in CLI
     if args.find_key is not None and args.find_value is not None:
-        found = key_value_find(cross_check, args.find_key, args.find_value)
-        # print the dict
-        print("found:", len(found), "items with search constraints")
-        for x in found:
-            print(
-                x["guid"], ":", x["name"], "with", args.find_key, ":",
-                x[args.find_key])
+        print_found(cross_check, args.find_key, args.find_value)
+
+
+# Read the results of the baseline run
+# They are read and processed as the results of the run, with the same
+# configuration option, filter and sort. A baseline markdown summary is read
+# with its data, when possible.
+def read_baseline(args: argparse.Namespace, here: str) -> DbType:
+    run: Run = {
+        'name': 'baseline',
+        'log': '',
+        'seq': '',
+        'config': args.config,
+    }
+
+    if args.baseline_md is not None:
+        input_md = args.baseline_md
+    else:
+        input_md = None
+        run['log'], run['seq'] = args.baseline
+
+    b = argparse.Namespace(**{**vars(args), 'input_md': input_md})
+    cross_check, _ = read_run(b, here, {}, run)
+    return cross_check
+
+
+# Compare the results of a run with the baseline results
+# We print a summary and generate the markdown report.
+def write_diff(
+        args: argparse.Namespace, meta: MetaData, base: DbType,
+        cross_check: DbType, outdir: Optional[str]) -> None:
+
+    d = diff_runs(base, cross_check)
+    print_diff_summary(d)
+    diff = out_name(args.diff, outdir)
+    assert diff is not None
+    gen_diff_md(diff, d, meta)
+
+
+# Process the results of a single run
+# We read the run results, apply the configuration and generate all the
+# outputs requested in args.
+# We return the number of tests for each result.
+def process_run(
+        args: argparse.Namespace, here: str, meta: MetaData, run: Run,
+        outdir: Optional[str] = None) -> dict[str, int]:
+
+    if profiles is not None:
+        profiles.clear()
+
+    # Read the baseline results first, if any, so that the profile of the
+    # stages below is the one of the run.
+    base = None
+
+    if args.baseline is not None or args.baseline_md is not None:
+        meta['baseline'] = args.baseline_md if args.baseline_md is not None \
+            else ' '.join(args.baseline)
+
+        with stage('read_baseline') as p:
+            base = read_baseline(args, here)
+            p['records'] = len(base)
+
+    cross_check, bins, known = bin_run(args, here, meta, run)
+
+    # Print a one-line summary
+    print_summary(bins, set(bins.keys()))
+
+    # Print meta-data
+    if args.print_meta:
+        print_meta(meta)
+
+    # The meta-data holds the profile of the stages up to this point.
+    if profiles is not None:
+        import json  # pylint: disable=import-outside-toplevel
+
+        meta['profile'] = json.dumps(profiles, sort_keys=True)
+
+    with stage('write_md', len(cross_check)):
+        write_md(args, meta, bins, outdir)
+        write_md_data(args, meta, cross_check, outdir)
+
+    # Compare with the baseline before the fields are filtered
+    if base is not None:
+        with stage('diff', len(cross_check)):
+            write_diff(args, meta, base, cross_check, outdir)
+
+    write_outputs(args, meta, cross_check, known, outdir)
+
+    if profiles is not None:
+        print_profile(profiles)
+
+    return {k: len(v) for k, v in bins.items()}
+
+
+# Read and bin the results of a single run
+# We return the tests, their bins and the set of their fields when we know it
+# without looking at the tests, or None.
+def bin_run(
+        args: argparse.Namespace, here: str, meta: MetaData, run: Run
+        ) -> tuple[DbType, BinsType, Optional[set[str]]]:
+
+    # The columnar database is converted to dicts only for output.
+    known: Optional[set[str]] = None
+
+    if args.follow:
+        with stage('follow') as p:
+            cross_check, known = follow_run(args, here, meta, run)
+            p['records'] = len(cross_check)
+
+        with stage('bin_results', len(cross_check)):
+            bins = bin_results(cross_check)
+    elif args.columnar:
+        cdb = read_run_columnar(args, here, meta, run)
+
+        with stage('bin_results', len(cdb)):
+            cross_check = cdb.to_dicts()
+            bins = bin_results_columnar(cdb, cross_check)
+
+        del cdb
+    else:
+        cross_check, known = read_run(args, here, meta, run)
+
+        with stage('bin_results', len(cross_check)):
+            bins = bin_results(cross_check)
+
+    return cross_check, bins, known
+
+
+# Load a batch manifest
+# Relative paths are taken from the folder of the manifest.
+# Runs without a name are auto-named after their position.
+def load_batch(filename: str) -> list[Run]:
+    logging.debug(f'Read {filename}')
+
+    with open(filename, 'r') as yamlfile:
+        y = yaml.load(yamlfile, Loader=SafeLoader)
+
+    d = os.path.dirname(filename)
+    runs: list[Run] = []
+    names = set()
+
+    for i, x in enumerate(y or []):
+        r: Run = {
+            'name': str(x['name']) if 'name' in x else f'run{i}',
+            'log': os.path.join(d, x['log']),
+            'seq': os.path.join(d, x['seq']),
+            'config':
+                os.path.join(d, x['config']) if 'config' in x else None,
+        }
+
+        # The name is used as a folder name, which must stay in the batch
+        # folder.
+        if not re.fullmatch(r'[\w.-]+', r['name']) \
+                or r['name'] in ('.', '..'):
+            logging.error(f"{red}Invalid run name{normal} {i} `{r['name']}'")
+            sys.exit(1)
+
+        if r['name'] in names:
+            logging.error(f"{red}Duplicate run{normal} {i} `{r['name']}'")
+            sys.exit(1)
+
+        names.add(r['name'])
+        runs.append(r)
+
+    logging.debug(f"{len(runs)} run(s)")
+    return runs
+
+
+# Initialize a batch worker process
+# We pre-load the index of known sequence files and the configuration
+# files, which are then shared by all the runs of the worker.
+# With the fork start method, this was already done by the parent process.
+def batch_init(
+        seq_db: str, configs: list[str], cache_dir: Optional[str]) -> None:
+    init_file_cache(cache_dir)
+    load_seq_index(seq_db)
+
+    for c in configs:
+        load_config(c)
+
+
+# Process a run of a batch, in a worker process
+# We return the run name, and the number of tests for each result, or None in
+# case of error.
+def batch_run(
+        args: argparse.Namespace, here: str, meta: MetaData, outdir: str,
+        run: Run) -> tuple[str, Optional[dict[str, int]]]:
+
+    d = os.path.join(outdir, run['name'])
+    logging.info(f"Processing run `{run['name']}' into `{d}'")
+
+    try:
+        os.makedirs(d, exist_ok=True)
+
+        if run['config'] is None:
+            run = {**run, 'config': args.config}
+
+        r = process_run(args, here, {**meta, 'batch-run': run['name']}, run, d)
+
+    # Our error paths exit, which must not take the worker down.
+    except (Exception, SystemExit) as e:
+        logging.error(f"{red}Run `{run['name']}' failed{normal}: {e!r}")
+        return run['name'], None
+
+    return run['name'], r
+
+
+# Generate the batch summary markdown
+# We output one line per run, with the number of tests for each result.
+def gen_batch_md(
+        md: str, results: list[tuple[str, Optional[dict[str, int]]]],
+        meta: MetaData) -> None:
+
+    logging.debug(f'Generate {md}')
+    res_keys: set[str] = set()
+
+    for _, r in results:
+        if r is not None:
+            res_keys.update(r.keys())
+
+    keys = sorted(res_keys)
+
+    with open(md, 'w') as resultfile:
+        resultfile.write("# SCT Batch Summary\n\n")
+        resultfile.write(
+            '|Run|Status|' + ''.join(f"{k.title()}|" for k in keys) + '\n')
+        resultfile.write('|--|--|' + '--|' * len(keys) + '\n')
+
+        for name, r in results:
+            if r is None:
+                cols = ['ERROR'] + [''] * len(keys)
+            else:
+                cols = ['OK'] + [str(r.get(k, 0)) for k in keys]
+
+            resultfile.write(f"|{name}|" + ''.join(f"{c}|" for c in cols))
+            resultfile.write('\n')
+
+        resultfile.write("\n\n")
+
+        # Meta-data
+        resultfile.write('## Meta-data\n\n')
+        resultfile.write("|  |  |\n")
+        resultfile.write("|--|--|\n")
+
+        for k in sorted(meta.keys()):
+            resultfile.write(f"|{k}:|{meta[k]}|\n")
+
+
+# Process all the runs of a batch in parallel worker processes
+# Each run outputs are written in a sub-folder of outdir named after the run,
+# and a summary is written in outdir.
+# We return True when all runs were processed successfully.
+def process_batch(
+        args: argparse.Namespace, here: str, meta: MetaData,
+        runs: list[Run], outdir: str) -> bool:
+    import multiprocessing  # pylint: disable=import-outside-toplevel
+
+    os.makedirs(outdir, exist_ok=True)
+
+    # Pre-load what we can before forking the workers.
+    configs = set(r['config'] for r in runs if r['config'] is not None)
+
+    if args.config is not None:
+        configs.add(args.config)
+    else:
+        configs.add(f'{here}/EBBR.yaml')
+
+    batch_init(args.seq_db, sorted(configs), args.cache_dir)
+
+    with multiprocessing.Pool(
+            args.jobs, initializer=batch_init,
+            initargs=(args.seq_db, sorted(configs), args.cache_dir)) as pool:
+        results = pool.map(
+            functools.partial(batch_run, args, here, meta, outdir), runs)
+
+    gen_batch_md(os.path.join(outdir, 'summary.md'), results, meta)
+    n = sum(1 for _, r in results if r is None)
+
+    if n:
+        logging.error(
+            f"{red}{n} {maybe_plural(n, 'run')} failed{normal}"
+            f" out of {len(results)}")
+    else:
+        logging.info(
+            f"{green}Processed{normal} {len(results)}"
+            f" {maybe_plural(len(results), 'run')} into `{outdir}'")
+
+    return not n
+
+
+# Convert a command line argument to a non-negative integer
+def non_negative(s: str) -> int:
+    n = int(s)
+
+    if n < 0:
+        raise argparse.ArgumentTypeError(f"`{s}' is negative")
+
+    return n
+
+
+if __name__ == '__main__':
+    me = os.path.realpath(__file__)
+    here = os.path.dirname(me)
+    parser = argparse.ArgumentParser(
+        description='Process SCT results.'
+                    ' This program takes the SCT summary and sequence files,'
+                    ' and generates a nice report in mardown format.',
+        epilog='When sorting is requested, tests data are sorted'
+               ' according to the first sort key, then the second, etc.'
+               ' Sorting happens after update by the configuration rules.'
+               ' Useful example: --sort'
+               ' "group,descr,set guid,test set,sub set,guid,name,log"'
+               ' When not validating a configuration file, an input .ekl and'
+               ' an input .seq files are required.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--csv', help='Output .csv filename')
+    parser.add_argument('--json', help='Output .json filename')
+    parser.add_argument('--jsonl', help='Output .jsonl filename')
+    parser.add_argument('--sqlite', help='Output .sqlite filename')
+
+    parser.add_argument('--junit', help='Output .junit filename')
+    parser.add_argument(
+        '--md', help='Output .md filename', default='result.md')
+    parser.add_argument(
+        '--md-shards', action='store_true',
+        help='Write the tests tables of the .md in one file per result and'
+             ' group')
+    parser.add_argument(
+        '--md-data', action='store_true',
+        help='Write all the tests next to the .md, to re-read them losslessly'
+             ' with --input-md')
+    parser.add_argument(
+        '--debug', action='store_true', help='Turn on debug messages')
+    parser.add_argument(
+        '--sort', help='Comma-separated list of keys to sort output on')
+    parser.add_argument('--filter', help='Python expression to filter results')
+    parser.add_argument(
+        '--fields', help='Comma-separated list of fields to write')
+    parser.add_argument(
+        '--uniq', action='store_true', help='Collapse duplicates')
+    parser.add_argument(
+        '--print', action='store_true', help='Print results to stdout')
+    parser.add_argument(
+        '--limit', '--head', type=non_negative,
+        help='Print at most LIMIT tests')
+    parser.add_argument(
+        '--print-width', type=non_negative, default=80,
+        help='Maximum width of the printed fields, or 0 for no limit')
+    parser.add_argument(
+        '--no-pager', action='store_true',
+        help='Do not print through a pager on a terminal')
+    parser.add_argument(
+        '--print-meta', action='store_true', help='Print meta-data to stdout')
+    parser.add_argument('--input-md', help='Input .md filename')
+    parser.add_argument(
+        '--baseline', nargs=2, metavar=('EKL', 'SEQ'),
+        help='Baseline .ekl and .seq filenames to compare with')
+    parser.add_argument(
+        '--baseline-md', help='Baseline .md filename to compare with')
+    parser.add_argument(
+        '--diff', help='Output comparison .md filename', default='diff.md')
+    parser.add_argument(
+        '--seq-db', help='Known sequence files database filename',
+        default=f'{here}/seq_db.yaml')
+    parser.add_argument('log_file', nargs='?', help='Input .ekl filename')
+    parser.add_argument('seq_file', nargs='?', help='Input .seq filename')
+    parser.add_argument('find_key', nargs='?', help='Search key')
+    parser.add_argument('find_value', nargs='?', help='Search value')
+    parser.add_argument('--config', help='Input .yaml configuration filename')
+    parser.add_argument('--yaml', help='Output .yaml filename')
+    parser.add_argument(
+        '--template', help='Output .yaml config template filename')
+    parser.add_argument(
+        '--template-cover', action='store_true',
+        help='Generate a minimal set of template rules covering the tests')
+    parser.add_argument(
+        '--cache-dir',
+        help='Folder where to cache parsed .ekl and .seq files. The'
+             ' configuration and seq db are cached there too, instead of'
+             ' in the user cache folder')
+    parser.add_argument(
+        '--follow', action='store_true',
+        help='Follow the input .ekl while it grows during a run')
+    parser.add_argument(
+        '--follow-interval', type=float, default=1,
+        help='Interval in seconds between reads of the followed .ekl')
+    parser.add_argument(
+        '--follow-idle', type=float, default=600,
+        help='Stop following the .ekl when it has not grown for this many'
+             ' seconds')
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='Print the time and memory used by each stage')
+    parser.add_argument(
+        '--profile-memory', action='store_true',
+        help='Also trace memory allocations when profiling (slower)')
+    parser.add_argument(
+        '--columnar', action='store_true',
+        help='Process tests data column-at-a-time')
+    parser.add_argument(
+        '--batch', help='Input batch manifest .yaml filename')
+    parser.add_argument(
+        '--batch-dir', help='Output folder for batch mode', default='batch')
+    parser.add_argument(
+        '--jobs', type=int, help='Number of parallel jobs for batch mode',
+        default=os.cpu_count())
+    args = parser.parse_args()
+
+    init_colors()
+    init_file_cache(args.cache_dir)
+
+    if args.profile or args.profile_memory:
+        init_profile(args.profile_memory)
+
+    logging.basicConfig(
+        format='%(levelname)s %(funcName)s: %(message)s',
+        level=logging.DEBUG if args.debug else logging.INFO)
+
+    ln = logging.getLevelName(logging.WARNING)
+    logging.addLevelName(logging.WARNING, f"{yellow}{ln}{normal}")
+    ln = logging.getLevelName(logging.ERROR)
+    logging.addLevelName(logging.ERROR, f"{red}{ln}{normal}")
+
+    # Batch mode processes all the runs of a manifest.
+    if args.batch is not None:
+        if args.log_file is not None or args.input_md is not None \
+                or args.follow or args.baseline is not None \
+                or args.baseline_md is not None:
+            logging.error(
+                "No input .ekl, .seq, .md, --follow or baseline with --batch!")
+            sys.exit(1)
+
+        meta = meta_data(sys.argv, here)
+        ok = process_batch(
+            args, here, meta, load_batch(args.batch), args.batch_dir)
+        sys.exit(0 if ok else 1)
+
+    # We must have a log file and a seq file.
+    if args.log_file is None:
+        logging.error("No input .ekl!")
+        sys.exit(1)
+    if args.seq_file is None:
+        logging.error("No input .seq!")
+        sys.exit(1)
+
+    if args.baseline is not None and args.baseline_md is not None:
+        logging.error("No --baseline with --baseline-md!")
+        sys.exit(1)
+
+    # Following a run reads the .ekl directly.
+    if args.follow and (
+            args.input_md is not None or args.cache_dir is not None
+            or args.columnar):
+        logging.error(
+            "No --input-md, --cache-dir or --columnar with --follow!")
+        sys.exit(1)
+
+    # Prepare initial meta-data.
+    meta = meta_data(sys.argv, here)
+
+    # Command line argument 1 is the ekl file to open.
+    # Command line argument 2 is the seq file to open.
+    process_run(args, here, meta, {
+        'name': '',
+        'log': args.log_file,
+        'seq': args.seq_file,
+        'config': args.config,
+    })
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# SCT results store query
+# We answer search, count and group-by questions from the SQLite database
+# generated by the parser with --sqlite, without reading the .ekl again.
+
+import argparse
+import logging
+import os
+import pathlib
+import sqlite3
+import sys
+
+import parser  # pylint: disable=deprecated-module
+
+
+# Open a results store read-only
+def open_store(filename: str) -> sqlite3.Connection:
+    if not os.path.isfile(filename):
+        logging.error(f"{parser.red}No results store{parser.normal}"
+                      f" `{filename}'!")
+        sys.exit(1)
+
+    logging.debug(f'Read {filename}')
+    uri = pathlib.Path(filename).resolve().as_uri()
+    db = sqlite3.connect(f'{uri}?mode=ro', uri=True)
+    db.row_factory = sqlite3.Row
+    return db
+
+
+# Return the fields of the tests in the store
+def store_fields(db: sqlite3.Connection) -> list[str]:
+    return [r['name'] for r in db.execute('PRAGMA table_info(tests)')]
+
+
+# Verify that a field is in the store
+def check_field(fields: list[str], f: str) -> None:
+    if f not in fields:
+        logging.error(f"{parser.red}Unknown field{parser.normal} `{f}'!")
+        sys.exit(1)
+
+
+# Build the SQL condition from a list of `key=value' strings
+# We return the condition and its parameters.
+def where_clause(
+        fields: list[str], where: list[str]) -> tuple[str, list[str]]:
+    c = []
+    p = []
+
+    for w in where:
+        k, sep, v = w.partition('=')
+
+        if not sep:
+            logging.error(
+                f"{parser.red}Bad condition{parser.normal} `{w}'!")
+            sys.exit(1)
+
+        check_field(fields, k)
+        c.append(f'{parser.sql_name(k)} = ?')
+        p.append(v)
+
+    return (f" WHERE {' AND '.join(c)}" if c else ''), p
+
+
+# Print the tests matching a key & value search, like the parser does
+def do_find(db: sqlite3.Connection, args: argparse.Namespace) -> None:
+    fields = store_fields(db)
+    check_field(fields, args.key)
+    w, p = where_clause(fields, [f'{args.key}={args.value}', *args.where])
+    found = [dict(r) for r in db.execute(f'SELECT * FROM tests{w}', p)]
+    parser.print_found_tests(found, args.key)
+
+
+# Print the number of tests matching the conditions
+def do_count(db: sqlite3.Connection, args: argparse.Namespace) -> None:
+    w, p = where_clause(store_fields(db), args.where)
+    print(db.execute(f'SELECT COUNT(*) FROM tests{w}', p).fetchone()[0])
+
+
+# Print the number of tests for each value of a field, most frequent first
+def do_group_by(db: sqlite3.Connection, args: argparse.Namespace) -> None:
+    fields = store_fields(db)
+    check_field(fields, args.key)
+    w, p = where_clause(fields, args.where)
+    k = parser.sql_name(args.key)
+    r: parser.DbType = [
+        {args.key: '' if x[0] is None else str(x[0]), 'tests': str(x[1])}
+        for x in db.execute(
+            f'SELECT {k}, COUNT(*) AS n FROM tests{w} GROUP BY {k}'
+            f' ORDER BY n DESC, {k}', p)]
+
+    parser.do_print(r, [args.key, 'tests'])
+
+
+# Print the meta-data of the store
+def do_meta(db: sqlite3.Connection, _: argparse.Namespace) -> None:
+    parser.print_meta(
+        {r['key']: r['value'] for r in db.execute('SELECT * FROM meta')})
+
+
+if __name__ == '__main__':
+    argp = argparse.ArgumentParser(
+        description='Query an SCT results store.',
+        epilog='Conditions are of the form key=value, and select the tests'
+               ' for which the field key is equal to value.'
+               ' The store is generated by the parser with --sqlite.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argp.add_argument(
+        '--debug', action='store_true', help='Turn on debug messages')
+    argp.add_argument(
+        '--where', action='append', default=[],
+        help='Condition on the tests, which can be repeated')
+    argp.add_argument('store', help='Input .sqlite filename')
+    sub = argp.add_subparsers(dest='command', required=True)
+
+    cmd = sub.add_parser(
+        'find', help='Print the tests with key equal to value')
+    cmd.add_argument('key', help='Search key')
+    cmd.add_argument('value', help='Search value')
+    cmd.set_defaults(func=do_find)
+
+    cmd = sub.add_parser('count', help='Print the number of tests')
+    cmd.set_defaults(func=do_count)
+
+    cmd = sub.add_parser(
+        'group-by', help='Print the number of tests for each value of key')
+    cmd.add_argument('key', help='Grouping key')
+    cmd.set_defaults(func=do_group_by)
+
+    cmd = sub.add_parser('meta', help='Print the meta-data')
+    cmd.set_defaults(func=do_meta)
+
+    args = argp.parse_args()
+
+    parser.init_colors()
+
+    logging.basicConfig(
+        format='%(levelname)s %(funcName)s: %(message)s',
+        level=logging.DEBUG if args.debug else logging.WARNING)
+
+    store = open_store(args.store)
+    args.func(store, args)
+    store.close()
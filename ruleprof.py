@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# SCT configuration rules profiler
+# We run the rules of a configuration over a corpus of logs, the way the parser
+# applies them, and we record for each rule how many times it was evaluated,
+# how many tests it updated and the time spent evaluating it. We also evaluate
+# the rules, which come after the first matching rule, to find the rules never
+# matching (dead) and the rules matching only tests already updated by an
+# earlier rule (shadowed).
+
+import argparse
+import logging
+import os
+import sys
+import time
+from typing import Iterable, Optional, TypedDict
+
+import parser  # pylint: disable=deprecated-module
+
+# The fields of the per-rule profile
+profile_fields = [
+    'rule', 'index', 'evaluations', 'matches', 'shadowed', 'time (ms)',
+    'ns per evaluation']
+
+
+# The profile of a rule
+# evaluations and ns are the number of evaluations of the rule criteria and the
+# time spent there, in nanoseconds, when applying the rules as the parser does.
+# matches is the number of tests updated by the rule. shadowed is the number
+# of tests, which the rule matches but which were updated by an earlier rule,
+# with the names of those rules in shadowed_by.
+class RuleProfile(TypedDict):
+    rule: str
+    index: str
+    evaluations: int
+    matches: int
+    shadowed: int
+    ns: int
+    shadowed_by: dict[str, int]
+
+
+# Prepare the profiles of the rules of a configuration
+def init_profiles(
+        conf: parser.ConfigType,
+        index: parser.RulesIndex) -> list[RuleProfile]:
+
+    prof: list[RuleProfile] = [{
+        'rule': r['rule'],
+        'index': '',
+        'evaluations': 0,
+        'matches': 0,
+        'shadowed': 0,
+        'ns': 0,
+        'shadowed_by': {},
+    } for r in conf]
+
+    for k in parser.index_keys:
+        for j in index['indexed'][k]:
+            prof[j]['index'] = k
+
+    return prof
+
+
+# Profile the rules over the tests of a run
+# Until a rule matches, we time the evaluations; this is what apply_rules()
+# does. We then go on evaluating the remaining candidate rules, without timing,
+# to find the shadowed ones. The tests are not modified.
+def profile_rules(
+        cross_check: Iterable[parser.DbEntry], conf: parser.ConfigType,
+        index: parser.RulesIndex, prof: list[RuleProfile]) -> int:
+
+    n = 0
+    clock = time.perf_counter_ns
+
+    for test in cross_check:
+        n += 1
+        winner = None
+
+        for j in parser.candidate_rules(test, index):
+            crit = conf[j]['criteria']
+            p = prof[j]
+
+            if winner is not None:
+                if parser.matches_crit(test, crit):
+                    p['shadowed'] += 1
+                    w = prof[winner]['rule']
+                    p['shadowed_by'][w] = p['shadowed_by'].get(w, 0) + 1
+
+                continue
+
+            t = clock()
+            m = parser.matches_crit(test, crit)
+            p['ns'] += clock() - t
+            p['evaluations'] += 1
+
+            if m:
+                p['matches'] += 1
+                winner = j
+
+    return n
+
+
+# Read the tests of a run, before rules application
+def read_run(
+        log: str, seq: str, cache_dir: Optional[str]) -> parser.DbType:
+
+    if cache_dir is not None:
+        return parser.cached_log_and_seq(log, seq, cache_dir)
+
+    return parser.read_log_and_seq(log, seq)
+
+
+# Return the runs of the corpus, as a list of (log, seq) tuples
+# The runs are taken from a batch manifest and from the command line, which
+# lists .ekl and .seq filenames in pairs.
+def corpus_runs(args: argparse.Namespace) -> list[tuple[str, str]]:
+    if len(args.files) % 2:
+        logging.error(f"{parser.red}Missing .seq{parser.normal} for `"
+                      f"{args.files[-1]}'!")
+        sys.exit(1)
+
+    r = list(zip(args.files[::2], args.files[1::2]))
+
+    if args.batch is not None:
+        r += [(x['log'], x['seq']) for x in parser.load_batch(args.batch)]
+
+    if not r:
+        logging.error(f"{parser.red}No input .ekl and .seq!{parser.normal}")
+        sys.exit(1)
+
+    return r
+
+
+# Convert the profiles to tests-like dicts for output, slowest rules first
+def profiles_table(prof: list[RuleProfile]) -> parser.DbType:
+    return [{
+        'rule': p['rule'],
+        'index': p['index'],
+        'evaluations': str(p['evaluations']),
+        'matches': str(p['matches']),
+        'shadowed': str(p['shadowed']),
+        'time (ms)': f"{p['ns'] / 1e6:.3f}",
+        'ns per evaluation':
+            f"{p['ns'] / p['evaluations']:.0f}" if p['evaluations'] else '',
+    } for p in sorted(prof, key=lambda p: (-p['ns'], p['rule']))]
+
+
+# Generate the rules profile markdown report
+# We list the dead rules, the shadowed rules and then all the rules.
+# We output meta-data
+def gen_ruleprof_md(
+        filename: str, prof: list[RuleProfile], meta: parser.MetaData) -> None:
+
+    logging.debug(f'Generate {filename}')
+    dead = [p for p in prof if not p['matches'] and not p['shadowed']]
+    shadowed = [p for p in prof if not p['matches'] and p['shadowed']]
+
+    with open(filename, 'w') as resultfile:
+        resultfile.write("# SCT Rules Profile\n\n")
+        resultfile.write("## 1. Dead rules")
+        parser.dict_2_md([{'rule': p['rule']} for p in dead], resultfile)
+        resultfile.write("## 2. Shadowed rules")
+        parser.dict_2_md([{
+            'rule': p['rule'],
+            'shadowed': str(p['shadowed']),
+            'shadowed by': ', '.join(sorted(p['shadowed_by'])),
+        } for p in shadowed], resultfile)
+        resultfile.write("## 3. All rules")
+        parser.dict_2_md(profiles_table(prof), resultfile)
+
+        # Meta-data
+        resultfile.write('## Meta-data\n\n')
+        resultfile.write("|  |  |\n")
+        resultfile.write("|--|--|\n")
+
+        for k in sorted(meta.keys()):
+            resultfile.write(f"|{k}:|{meta[k]}|\n")
+
+
+if __name__ == '__main__':
+    here = os.path.dirname(os.path.realpath(__file__))
+    argp = argparse.ArgumentParser(
+        description='Profile the rules of a configuration over a corpus of'
+                    ' SCT logs.',
+        epilog='A rule is dead when it matches no test of the corpus, and'
+               ' shadowed when it matches only tests, which an earlier rule'
+               ' updated.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argp.add_argument(
+        '--debug', action='store_true', help='Turn on debug messages')
+    argp.add_argument(
+        '--config', help='Input .yaml configuration filename',
+        default=f'{here}/EBBR.yaml')
+    argp.add_argument('--batch', help='Input batch manifest .yaml filename')
+    argp.add_argument(
+        '--cache-dir',
+        help='Folder where to cache parsed .ekl and .seq files. The'
+             ' configuration is cached there too, instead of in the user'
+             ' cache folder')
+    argp.add_argument(
+        '--md', help='Output .md filename', default='ruleprof.md')
+    argp.add_argument('--csv', help='Output per-rule .csv filename')
+    argp.add_argument(
+        'files', nargs='*', help='Input .ekl and .seq filenames, in pairs')
+    args = argp.parse_args()
+
+    parser.init_colors()
+    parser.init_file_cache(args.cache_dir)
+
+    logging.basicConfig(
+        format='%(levelname)s %(funcName)s: %(message)s',
+        level=logging.DEBUG if args.debug else logging.INFO)
+
+    config = parser.load_config(args.config)
+    rules_index = parser.index_rules(config)
+    profiles = init_profiles(config, rules_index)
+    tests = 0
+
+    for log_file, seq_file in corpus_runs(args):
+        tests += profile_rules(
+            read_run(log_file, seq_file, args.cache_dir), config, rules_index,
+            profiles)
+
+    nd = sum(1 for x in profiles if not x['matches'] and not x['shadowed'])
+    ns = sum(1 for x in profiles if not x['matches'] and x['shadowed'])
+
+    logging.info(
+        f"{len(profiles)} rule(s) over {tests} test(s):"
+        f" {parser.yellow if nd else ''}{nd} dead{parser.normal},"
+        f" {ns} shadowed")
+
+    gen_ruleprof_md(args.md, profiles, parser.meta_data(sys.argv, here))
+
+    if args.csv is not None:
+        parser.write_all(
+            [parser.CsvWriter(args.csv, profile_fields)],
+            profiles_table(profiles))
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# Synthetic SCT results generator
+# We generate an .ekl log file and the corresponding .seq file, at a
+# configurable scale. The test sets are taken from a real .seq file and the
+# tests from the rules of a configuration file, so that the generated results
+# look like real ones and exercise the configuration rules.
+
+import argparse
+import logging
+import os
+import random
+import shutil
+from typing import IO
+
+import parser  # pylint: disable=deprecated-module
+
+# The results of generated tests and their weights, for tests not coming from a
+# configuration rule.
+results = {
+    'PASS': 90,
+    'FAILURE': 4,
+    'WARNING': 3,
+}
+
+# The fields of a test set, which we take from the rules criteria.
+set_fields = [
+    'sub set', 'test set', 'group', 'descr', 'device path', 'revision']
+
+# The fields of a test, which we take from the rules criteria.
+test_fields = ['guid', 'name', 'log', 'result']
+
+# The probability for a test to come from a configuration rule, when there are
+# rules for its test set.
+rule_hits = 0.05
+
+# The probability for a test set to be dropped, to be preceded by a spurious
+# test set or to be skipped.
+odd_sets = 0.02
+
+
+# Collect test sets and tests from the configuration rules criteria
+# We return a dict of test set fields and a dict of tests lists, both indexed
+# by set guid.
+def rules_catalog(conf: parser.ConfigType) -> tuple[
+        dict[str, dict[str, str]], dict[str, list[dict[str, str]]]]:
+
+    sets: dict[str, dict[str, str]] = {}
+    tests: dict[str, list[dict[str, str]]] = {}
+
+    for r in conf:
+        c = r['criteria']
+
+        if 'set guid' not in c:
+            continue
+
+        s = sets.setdefault(c['set guid'], {})
+
+        for k in set_fields:
+            if k in c:
+                s.setdefault(k, str(c[k]))
+
+        if all(k in c for k in test_fields):
+            tests.setdefault(c['set guid'], []).append(
+                {k: str(c[k]) for k in test_fields})
+
+    logging.debug(f"{len(sets)} test set(s), {len(tests)} with tests")
+    return sets, tests
+
+
+# Generate a random GUID string
+def random_guid(rnd: random.Random) -> str:
+    h = f'{rnd.getrandbits(128):032X}'
+    return f'{h[0:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:32]}'
+
+
+# Complete the fields of a test set from the .seq file
+def set_info(seq: dict[str, str], s: dict[str, str]) -> dict[str, str]:
+    return {
+        'set guid': seq['guid'],
+        'sub set': seq['name'],
+        'test set': seq['name'],
+        'group': 'SyntheticTest',
+        'descr': seq['name'],
+        'device path': 'No device path',
+        'revision': seq['rev'],
+        **s,
+    }
+
+
+# Write the "HEAD" line of a test set
+# i is the test set number, which we use as start time.
+def write_head(f: IO[str], s: dict[str, str], i: int) -> None:
+    f.write(
+        f"|HEAD|||0||14-07-2020|{i // 3600 % 24:02}:{i // 60 % 60:02}:"
+        f"{i % 60:02}|{s['set guid']}|{s['revision']}|{s['sub set']}|"
+        f"{s['descr']}|{s['group']}\\{s['test set']}|{s['device path']}\r\n")
+
+
+# Write a test line
+def write_test(f: IO[str], t: dict[str, str]) -> None:
+    f.write(f"{t['guid']}:{t['result']}|{t['name']}:{t['log']}\r\n\r\n")
+
+
+# Generate random tests for a test set
+# A fraction of the tests comes from the rules of the set, if any.
+def set_tests(
+        rnd: random.Random, s: dict[str, str], rules: list[dict[str, str]],
+        n: int) -> list[dict[str, str]]:
+
+    # Each test set has its own small pool of tests, like in real logs.
+    c = f"/build/edk2/SctPkg/TestCase/UEFI/EFI/{s['group']}/{s['test set']}"
+    pool = [{
+        'guid': random_guid(rnd),
+        'name': f"{s['sub set']} - Assertion {j}",
+        'log': f"{c}/{s['sub set']}BBTest.c:{rnd.randrange(100, 3000)}:"
+               "Status - Success",
+    } for j in range(min(n, 32))]
+
+    names = list(results.keys())
+    weights = list(results.values())
+    r = []
+
+    for j in range(n):
+        if rules and rnd.random() < rule_hits:
+            t = dict(rnd.choice(rules))
+            t['log'] = f"/build/edk2/{t['log']}:{rnd.randrange(100, 3000)}:"
+        else:
+            t = {**pool[j % len(pool)],
+                 'result': rnd.choices(names, weights)[0]}
+
+        r.append(t)
+
+    return r
+
+
+# Write a test set with its tests
+def write_set(
+        f: IO[str], s: dict[str, str], i: int,
+        tests: list[dict[str, str]]) -> None:
+
+    write_head(f, s, i)
+
+    for t in tests:
+        write_test(f, t)
+
+    f.write('|TERM|\r\n')
+
+
+# Generate an .ekl log file with about n tests
+# The tests are spread over the test sets of the .seq file, which are meant to
+# run. Some test sets are left empty (skipped) or missing (dropped) and some
+# spurious test sets are added.
+# We return the number of tests written.
+def gen_ekl(
+        filename: str, seq: list[dict[str, str]], conf: parser.ConfigType,
+        n: int, rnd: random.Random) -> int:
+
+    logging.debug(f'Generate {filename}')
+    sets, tests = rules_catalog(conf)
+    per_set = max(1, n // max(1, len(seq)))
+    t = 0
+
+    with open(filename, 'w', encoding='utf-16', newline='') as f:
+        for i, x in enumerate(seq):
+            r = rnd.random()
+
+            # Dropped test set
+            if r < odd_sets:
+                continue
+
+            # Spurious test set, which runs before this one
+            if r < 2 * odd_sets:
+                s = set_info(
+                    {**x, 'guid': random_guid(rnd), 'name': 'Spurious'}, {})
+                write_set(f, s, i, set_tests(rnd, s, [], per_set))
+                t += per_set
+
+            s = set_info(x, sets.get(x['guid'], {}))
+
+            # Skipped test set, with no test
+            if r < 3 * odd_sets:
+                write_set(f, s, i, [])
+                continue
+
+            write_set(
+                f, s, i, set_tests(rnd, s, tests.get(x['guid'], []), per_set))
+            t += per_set
+
+    logging.info(f"Generated {t} {parser.maybe_plural(t, 'test')}")
+    return t
+
+
+# Generate a synthetic .ekl for a .seq file
+# We return the number of tests written.
+def generate(ekl: str, seq: str, config: str, n: int, seed: int) -> int:
+    return gen_ekl(
+        ekl, parser.read_seq_file(seq), parser.read_config(config), n,
+        random.Random(seed))
+
+
+if __name__ == '__main__':
+    here = os.path.dirname(os.path.realpath(__file__))
+    argp = argparse.ArgumentParser(
+        description='Generate synthetic SCT results.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argp.add_argument(
+        '--debug', action='store_true', help='Turn on debug messages')
+    argp.add_argument(
+        '--tests', type=int, default=100000,
+        help='Approximate number of tests to generate')
+    argp.add_argument(
+        '--seed', type=int, default=0, help='Random generator seed')
+    argp.add_argument(
+        '--source-seq', help='Source .seq filename',
+        default=f'{here}/contrib/v23.03_2.0.0/EBBR.seq')
+    argp.add_argument(
+        '--config', help='Configuration filename, to take tests from',
+        default=f'{here}/EBBR.yaml')
+    argp.add_argument('ekl', help='Output .ekl filename')
+    argp.add_argument('seq', help='Output .seq filename')
+    args = argp.parse_args()
+
+    logging.basicConfig(
+        format='%(levelname)s %(funcName)s: %(message)s',
+        level=logging.DEBUG if args.debug else logging.INFO)
+
+    # The .seq file is a copy of the source one.
+    shutil.copyfile(args.source_seq, args.seq)
+    generate(args.ekl, args.seq, args.config, args.tests, args.seed)